@@ -0,0 +1,102 @@
+"""
+JSON codec for the authorlist file.
+
+Uses `orjson` when it is installed, and the stdlib `json` otherwise.
+Both write the same canonical bytes as
+`json.dump(data, f, indent=2, sort_keys=True)`, so git diffs stay clean.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# what orjson writes as UTF-8, but json escapes with ensure_ascii
+NON_ASCII = re.compile(r'[^\x00-\x7e]')
+
+def _escape(match):
+    c = ord(match.group())
+    if c > 0xffff:
+        c -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xd800 | (c >> 10), 0xdc00 | (c & 0x3ff))
+    return '\\u{:04x}'.format(c)
+
+
+def loads(raw, accelerated=True):
+    """
+    Parse json.
+
+    Args:
+        raw (bytes): json text
+        accelerated (bool): use orjson if installed (default: True)
+
+    Returns: parsed data
+    """
+    if orjson and accelerated:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # let json raise, or parse what orjson does not support
+    return json.loads(raw)
+
+def dumps(data, accelerated=True):
+    """
+    Write canonical json: 2 space indent, sorted keys, ASCII only.
+
+    Args:
+        data: data to write, without floats
+        accelerated (bool): use orjson if installed (default: True)
+
+    Returns: bytes
+    """
+    if orjson and accelerated:
+        try:
+            text = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass  # not something orjson can write, so let json try
+        else:
+            if text.isascii():
+                return text
+            return NON_ASCII.sub(_escape, text.decode('utf-8')).encode('ascii')
+    return json.dumps(data, indent=2, sort_keys=True).encode('ascii')
+
+def load(filename, **kwargs):
+    """Read a json file.  See :py:func:`loads`."""
+    with open(filename, 'rb') as f:
+        return loads(f.read(), **kwargs)
+
+def dump(data, filename, **kwargs):
+    """Write a canonical json file.  See :py:func:`dumps`."""
+    with open(filename, 'wb') as f:
+        f.write(dumps(data, **kwargs))
+
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='benchmark json load/save')
+    parser.add_argument('filename', nargs='?', default='output.json', help='authorlist json file')
+    parser.add_argument('-n', '--number', type=int, default=10, help='repetitions')
+    args = parser.parse_args()
+
+    with open(args.filename, 'rb') as f:
+        raw = f.read()
+    for accelerated in (False, True):
+        if accelerated and not orjson:
+            print('orjson is not installed')
+            break
+        name = 'orjson' if accelerated else 'json'
+        start = time.perf_counter()
+        for _ in range(args.number):
+            data = loads(raw, accelerated=accelerated)
+        load_time = (time.perf_counter() - start) / args.number
+        start = time.perf_counter()
+        for _ in range(args.number):
+            out = dumps(data, accelerated=accelerated)
+        save_time = (time.perf_counter() - start) / args.number
+        print(f'{name:7s} load {load_time*1000:7.2f} ms  save {save_time*1000:7.2f} ms  identical: {out == raw}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Precompiled state snapshots, for fast startup.
+
+A compiled file holds the loaded :py:class:`authorlist.state.Store`
+and per-collab :py:class:`authorlist.state.State` views, with their
+sort keys and indexes already built.  It is only used while it
+matches the json file it was compiled from.
+
+Compiled files are pickles, so only load ones you made yourself.
+
+Build one with::
+
+    python -m authorlist.compiled output.json
+"""
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import sys
+from datetime import datetime
+
+from . import index, record, state, util
+from .state import State, Store
+
+# modules with the classes and data in a compiled file
+PICKLED_MODULES = (index, record, state, util)
+
+
+def compiled_filename(json_filename):
+    return f'{json_filename}.state'
+
+def layout_hash():
+    """
+    Hash the code of the pickled classes and the Python version.
+
+    Compiled files from different code are not loaded, so a changed
+    class layout falls back to the json file instead of failing later.
+
+    Returns: str
+    """
+    h = hashlib.sha256(repr(sys.version_info[:2]).encode('utf-8'))
+    for module in PICKLED_MODULES:
+        with open(module.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _json_hash(json_filename):
+    with open(json_filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compile_states(json_filename, collabs, filename=None):
+    """
+    Load the json file, and write a compiled snapshot of the states.
+
+    Args:
+        json_filename (str): authorlist json file
+        collabs (dict): name: collab for each state view
+        filename (str): (optional) compiled file to write
+
+    Returns: dict of name: State
+    """
+    if filename is None:
+        filename = compiled_filename(json_filename)
+    store = Store(json_filename)
+    states = {name: State(collab=collab, store=store) for name,collab in collabs.items()}
+    header = {
+        'layout': layout_hash(),
+        'json_hash': store.content_hash,
+        'collabs': collabs,
+    }
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(states, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+    return states
+
+def load_states(json_filename, collabs, filename=None):
+    """
+    Load a compiled snapshot of the states.
+
+    Args:
+        json_filename (str): authorlist json file
+        collabs (dict): name: collab for each state view
+        filename (str): (optional) compiled file to read
+
+    Returns: dict of name: State, or None if missing or stale
+    """
+    if filename is None:
+        filename = compiled_filename(json_filename)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            header = pickle.load(m)
+            if header.get('layout') != layout_hash() or header.get('collabs') != collabs:
+                logging.info('compiled state %s is from a different version', filename)
+                return None
+            if header.get('json_hash') != _json_hash(json_filename):
+                logging.info('compiled state %s is stale', filename)
+                return None
+            states = pickle.load(m)
+    except Exception:
+        logging.warning('cannot load compiled state %s', filename, exc_info=True)
+        return None
+    store = next(iter(states.values()))._store
+    store.json_filename = os.fspath(json_filename)
+    store.modified = datetime.utcfromtimestamp(os.path.getmtime(json_filename))
+    return states
+
+
+def main():
+    import argparse
+    from .server import COLLAB_STATES
+    parser = argparse.ArgumentParser(description='compile an authorlist json file for fast startup')
+    parser.add_argument('json', help='authorlist json file')
+    parser.add_argument('-o', '--output', default=None, help='compiled file (default: <json>.state)')
+    args = parser.parse_args()
+    compile_states(args.json, COLLAB_STATES, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,13 @@ Handlers for different collaborations.
 from __future__ import print_function
 
 import os
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from datetime import datetime
 import codecs
 import csv
+import email.utils
+import functools
+import hashlib
 import json
 import re
 from io import StringIO
@@ -19,7 +22,9 @@ import tornado.web
 from tornado.escape import xhtml_escape
 
 from . import ICECUBE_START_DATE, PINGU_START_DATE, PINGU_END_DATE, GEN2_START_DATE, keycloak_utils
-from .util import today, validate_date, author_ordering
+from .compiled import layout_hash
+from .output import build, stream, CHUNK_SIZE
+from .util import today, validate_date
 
 
 def filter_thanks(thanks):
@@ -29,7 +34,20 @@ def filter_thanks(thanks):
     return ('', thanks)
 
 class Latex:
-    def __init__(self):
+    """
+    Unicode to LaTeX encoder.
+
+    Results are memoized, since the same names and citations are encoded
+    for every format and every request.  Plain ASCII text without LaTeX
+    special characters skips the encoder entirely.
+
+    Args:
+        maxsize (int): maximum number of memoized strings (default: 16384)
+    """
+    # anything the encoder would change: non-ASCII, control and special chars
+    NEEDS_ENCODING = re.compile(r'[^\t\n\r\x20-\x7e]|["#$%&<>\\^_{}~]')
+
+    def __init__(self, maxsize=16384):
         conversion_rules = [
             # our custom rules
             UnicodeToLatexConversionRule(RULE_REGEX, [
@@ -41,9 +59,94 @@ class Latex:
         ]
         self.u = UnicodeToLatexEncoder(conversion_rules=conversion_rules,
                                        replacement_latex_protection='braces-almost-all')
+        self._encode = functools.lru_cache(maxsize=maxsize)(self.u.unicode_to_latex)
+
     def encode(self, text):
-        return self.u.unicode_to_latex(text)
-utf8tolatex = Latex().encode
+        if not self.NEEDS_ENCODING.search(text):
+            return text
+        return self._encode(text)
+
+    def prewarm(self, texts):
+        """
+        Encode texts ahead of time, so requests find them memoized.
+
+        Args:
+            texts (iterable): strings to encode
+        """
+        for text in texts:
+            self.encode(text)
+
+    def cache_info(self):
+        return self._encode.cache_info()
+latex = Latex()
+utf8tolatex = latex.encode
+
+@functools.lru_cache(maxsize=256)
+def latex_acks(acks):
+    """
+    Get the LaTeX acknowledgements block.
+
+    Memoized by the acknowledgements, so every LaTeX format and request
+    in an epoch shares one block.
+
+    Args:
+        acks (tuple): acknowledgement texts, from a state snapshot
+
+    Returns: str
+    """
+    return '\n'.join(utf8tolatex(a) for a in acks)
+
+def prewarm_latex(state):
+    """
+    Memoize the LaTeX encoding of all text in a state.
+
+    Args:
+        state (:py:class:`authorlist.state.State`): state to encode
+    """
+    texts = state.strings()
+    latex.prewarm(texts)
+    # thanks are also shown without their "also at" prefix
+    latex.prewarm(filter_thanks(t)[1] for t in texts)
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered author lists.
+
+    Keys are (collab, state version, epoch, formatting, legacy), so every
+    date in an epoch shares one entry.
+
+    Args:
+        maxsize (int): maximum number of entries to keep (default: 256)
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries, e.g. when the state is reloaded."""
+        self._entries.clear()
 
 
 class AuthorListRenderer:
@@ -66,25 +169,172 @@ class AuthorListRenderer:
         'json': 'JSON structured data',
     }
 
-    def __init__(self, state):
+    #: formats that are a standalone document: media type and file extension
+    DOCUMENTS = {
+        'arxiv': ('text/plain', 'txt'),
+        'epjc': ('application/x-latex', 'tex'),
+        'revtex4': ('application/x-latex', 'tex'),
+        'aastex': ('application/x-latex', 'tex'),
+        'aastex7': ('application/x-latex', 'tex'),
+        'aascsv': ('text/csv', 'csv'),
+        'aa': ('application/x-latex', 'tex'),
+        'elsevier': ('application/x-latex', 'tex'),
+        'jhep': ('application/x-latex', 'tex'),
+        'jinst': ('application/x-latex', 'tex'),
+        'science': ('application/x-latex', 'tex'),
+        'inspire': ('application/xml', 'xml'),
+        'json': ('application/json', 'json'),
+    }
+
+    #: large formats that are streamed to the client
+    STREAMING = ('inspire', 'json', 'aastex7')
+
+    #: formats that need escaping for display in html
+    XML = ('inspire',)
+
+    #: placeholders for the query date in rendered output
+    DATE_PLACEHOLDER = '\x00date\x00'
+    TITLE_DATE_PLACEHOLDER = '\x00title_date\x00'
+
+    def __init__(self, state, cache=None):
         self.state = state
+        self.cache = cache
+        self._model_key = None
 
     def render(self, collab, date, formatting, legacy=False):
+        self._setup(collab, formatting, legacy)
+
+        # output only depends on the date epoch, except for the date itself
+        key = self._cache_key(date)
+        output = self.cache.get(key) if key else None
+        if output is None:
+            output = self._render_format(date)
+            if key:
+                self.cache.put(key, output)
+        return self._fill(output, date, legacy)
+
+    def render_stream(self, collab, date, formatting, legacy=False, raw=False, chunk_size=CHUNK_SIZE):
+        """
+        Render an author list, streaming the format text as it is produced.
+
+        Args:
+            collab (str): collaboration name
+            date (str): a date in ISO 8601 string format
+            formatting (str): one of the `DOCUMENTS` formats
+            legacy (bool): list legacy authors (default: False)
+            raw (bool): do not escape XML formats for html (default: False)
+            chunk_size (int): minimum chunk size, in characters
+
+        Returns: (dict of template kwargs without `format_text`, iterator of text chunks)
+        """
+        self._setup(collab, formatting, legacy)
+        if formatting not in self.DOCUMENTS:
+            raise tornado.web.HTTPError(400, reason='formatting type is not a document')
+
+        key = self._cache_key(date, raw=raw)
+        output = self.cache.get(key) if key else None
+        if output is not None:
+            kwargs = self._fill(output, date, legacy)
+            text = kwargs.pop('format_text')
+            chunks = (text[i:i+chunk_size] for i in range(0, len(text), chunk_size))
+        else:
+            output = self._render_format(date, raw=raw, join=False)
+            fragments = output.pop('format_text')
+            kwargs = self._fill(output, date, legacy)
+            chunks = self._stream(key, output, fragments, date, chunk_size)
+        return kwargs, chunks
+
+    def _setup(self, collab, formatting, legacy):
         if collab not in ('IceCube', 'IceCube-PINGU', 'IceCube-Gen2'):
             raise tornado.web.HTTPError(400, reason='bad collaboration')
         if formatting not in self.FORMATTING:
             raise tornado.web.HTTPError(400, reason='bad formatting type')
 
         self.collab = collab
-        self.date = date
         self.formatting = formatting
         self.legacy = True if formatting == 'legacy-institution' else legacy
-        self.authors = self.state.authors(date, legacy=self.legacy)
-        self.insts = self.state.institutions(date, legacy=self.legacy)
-        self.thanks = self.state.thanks(date, legacy=self.legacy)
-        self.acks = self.state.acknowledgements(date)
 
-        self.authors = sorted(self.authors, key=author_ordering)
+    def _cache_key(self, date, raw=False):
+        if self.cache is None:
+            return None
+        return (self.collab, self.state.version, self.state.epoch(date), self.formatting, bool(self.legacy), raw)
+
+    def _fill_dates(self, text, date):
+        return text.replace(self.DATE_PLACEHOLDER, date).replace(self.TITLE_DATE_PLACEHOLDER, date.replace('-',''))
+
+    def _fill(self, output, date, legacy):
+        """Make template kwargs from rendered output for a date."""
+        kwargs = {
+            'title': self.collab,
+            'date': date,
+            'formatting': self.formatting,
+            'formatting_options': AuthorListRenderer.FORMATTING,
+            'legacy': legacy,
+            'wrap': False,
+            'intro_text':'',
+        }
+        for k,v in output.items():
+            if isinstance(v, str):
+                v = self._fill_dates(v, date)
+            kwargs[k] = v
+        if self.collab == 'IceCube-PINGU':
+            txt = 'The IceCube/PINGU Collaboration list is provided for historical purposes.<br><br>'
+            txt += kwargs['intro_text']
+            kwargs['intro_text'] = txt
+        return kwargs
+
+    def _stream(self, key, output, fragments, date, chunk_size):
+        """Stream chunks of format text, caching the whole text at the end."""
+        chunks = [] if key else None
+        for chunk in stream(fragments, chunk_size):
+            if key:
+                chunks.append(chunk)
+            yield self._fill_dates(chunk, date)
+        if key:
+            self.cache.put(key, dict(output, format_text=build(chunks)))
+
+    def _render_format(self, date, raw=False, join=True):
+        """
+        Render the current formatting for the epoch of `date`.
+
+        The date is left as placeholders, so the output can be
+        shared by every date in the epoch.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+            raw (bool): do not escape XML formats for html (default: False)
+            join (bool): join `format_text`, instead of leaving it as
+                         an iterator of fragments (default: True)
+        """
+        self.date = self.DATE_PLACEHOLDER
+        self.title_date = self.TITLE_DATE_PLACEHOLDER
+        self._prepare(date)
+
+        output = getattr(self, '_'+self.formatting.replace('-','_'))()
+        if 'format_text' in output:
+            fragments = output['format_text']
+            if isinstance(fragments, str):
+                fragments = (fragments,)
+            if self.formatting in self.XML and not raw:
+                fragments = (xhtml_escape(f) for f in fragments)
+            output['format_text'] = build(fragments) if join else fragments
+        return output
+
+    def _prepare(self, date):
+        """
+        Load and sort the author list for the epoch of `date`.
+
+        This is shared by all formats rendered for the same epoch.
+        """
+        key = (self.state.version, self.state.epoch(date), bool(self.legacy))
+        if key == self._model_key:
+            return
+        snapshot = self.state.snapshot(date, legacy=self.legacy)
+        self.authors = list(snapshot.authors)
+        self.insts = dict(snapshot.institutions)
+        self.thanks = dict(snapshot.thanks)
+        self.acks = snapshot.acknowledgements
+        self.authors_by_inst = snapshot.authors_by_inst
 
         # sort institutions
         def ordering_inst(name):
@@ -109,37 +359,23 @@ class AuthorListRenderer:
         # sort thanks
         self.sorted_thanks = list(self.thanks) #sorted(thanks)
 
-
-        kwargs = {
-            'title': collab,
-            'date': date,
-            'formatting': formatting,
-            'formatting_options': AuthorListRenderer.FORMATTING,
-            'legacy': legacy,
-            'wrap': False,
-            'intro_text':'',
-        }
-        kwargs.update(getattr(self, '_'+formatting.replace('-','_'))())
-        if collab == 'IceCube-PINGU':
-            txt = 'The IceCube/PINGU Collaboration list is provided for historical purposes.<br><br>'
-            txt += kwargs['intro_text']
-            kwargs['intro_text'] = txt
-        return kwargs
+        # positions and per-author affiliations, shared by all formats
+        self.inst_numbers = {name: i for i,name in enumerate(self.sorted_insts)}
+        self.thanks_numbers = {name: i for i,name in enumerate(self.sorted_thanks)}
+        self.thanks_letters = {name: chr(ord('a') + i) for name,i in self.thanks_numbers.items()}
+        self.affiliations = [(
+            tuple(sorted((t for t in author.get('instnames') or () if t in self.inst_numbers), key=self.inst_numbers.__getitem__)),
+            tuple(sorted((t for t in author.get('thanks') or () if t in self.thanks), key=self.thanks_numbers.__getitem__)),
+        ) for author in self.authors]
+        self._model_key = key
 
     def _web(self):
         # format the authorlist
         authors_text = []
-        for author in self.authors:
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
             element = author['authname']
-            sup_inst = []
-            sup_thanks = []
-            if 'instnames' in author and author['instnames']:
-                for inst in author['instnames']:
-                    sup_inst.append(self.sorted_insts.index(inst)+1)
-            if 'thanks' in author and author['thanks']:
-                for t in author['thanks']:
-                    sup_thanks.append(chr(ord('a') + self.sorted_thanks.index(t)))
-            sup = ['{}'.format(s) for s in sorted(sup_inst)]+sorted(sup_thanks)
+            sup = [str(self.inst_numbers[inst]+1) for inst in instnames]
+            sup += [self.thanks_letters[t] for t in thanks]
             if sup and self.formatting == 'web':
                 element += '<sup>{}</sup>'.format(','.join(sup))
             authors_text.append(element)
@@ -155,31 +391,14 @@ class AuthorListRenderer:
         }
 
     def _web_institution(self):
-        authors_by_inst = defaultdict(list)
-        for author in self.authors:
-            for instname in author['instnames']:
-                text = author['authname']
-                if author.get('legacy', False):
-                    text += ' <span class="legacy">Legacy Author</span> '
-                if 'orcid' in author and author['orcid']:
-                    text += f'<a class="orcid" target="_blank" href="https://orcid.org/{author["orcid"]}"><img alt="ORCID logo" src="https://info.orcid.org/wp-content/uploads/2019/11/orcid_16x16.png" width="16" height="16" />https://orcid.org/{author["orcid"]}</a>'
-                authors_by_inst[instname].append(text)
         return {
-            'authors_by_inst': authors_by_inst,
+            'authors_by_inst': self._authors_by_inst_html(legacy_only=False),
             'insts': self.insts,
             'sorted_insts': self.sorted_insts,
         }
 
     def _legacy_institution(self):
-        authors_by_inst = defaultdict(list)
-        for author in self.authors:
-            for instname in author['instnames']:
-                text = author['authname']
-                if not author.get('legacy', False):
-                    continue
-                if 'orcid' in author and author['orcid']:
-                    text += f'<a class="orcid" target="_blank" href="https://orcid.org/{author["orcid"]}"><img alt="ORCID logo" src="https://info.orcid.org/wp-content/uploads/2019/11/orcid_16x16.png" width="16" height="16" />https://orcid.org/{author["orcid"]}</a>'
-                authors_by_inst[instname].append(text)
+        authors_by_inst = self._authors_by_inst_html(legacy_only=True)
         insts = {i:self.insts[i] for i in self.insts if i in authors_by_inst}
         sorted_insts = [i for i in self.sorted_insts if i in authors_by_inst]
         return {
@@ -188,19 +407,34 @@ class AuthorListRenderer:
             'sorted_insts': sorted_insts,
         }
 
+    def _authors_by_inst_html(self, legacy_only):
+        texts = {}
+        def author_html(author):
+            text = texts.get(id(author))
+            if text is None:
+                text = author['authname']
+                if author.get('legacy', False) and not legacy_only:
+                    text += ' <span class="legacy">Legacy Author</span> '
+                if 'orcid' in author and author['orcid']:
+                    text += f'<a class="orcid" target="_blank" href="https://orcid.org/{author["orcid"]}"><img alt="ORCID logo" src="https://info.orcid.org/wp-content/uploads/2019/11/orcid_16x16.png" width="16" height="16" />https://orcid.org/{author["orcid"]}</a>'
+                texts[id(author)] = text
+            return text
+
+        authors_by_inst = defaultdict(list)
+        for instname, authors in self.authors_by_inst.items():
+            if legacy_only:
+                authors = [a for a in authors if a.get('legacy', False)]
+                if not authors:
+                    continue
+            authors_by_inst[instname] = [author_html(a) for a in authors]
+        return authors_by_inst
+
     def _arxiv(self):
         authors_text = []
-        for author in self.authors:
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
             element = author['authname']
-            sup_inst = []
-            sup_thanks = []
-            if 'instnames' in author and author['instnames']:
-                for inst in author['instnames']:
-                    sup_inst.append(self.sorted_insts.index(inst)+1)
-            if 'thanks' in author and author['thanks']:
-                for t in author['thanks']:
-                    sup_thanks.append(chr(ord('a') + self.sorted_thanks.index(t)))
-            sup = ['{}'.format(s) for s in sorted(sup_inst)]+sorted(sup_thanks)
+            sup = [str(self.inst_numbers[inst]+1) for inst in instnames]
+            sup += [self.thanks_letters[t] for t in thanks]
             if sup and self.formatting == 'web':
                 element += '<sup>{}</sup>'.format(','.join(sup))
             authors_text.append(element)
@@ -211,59 +445,57 @@ class AuthorListRenderer:
             'wrap': True,
         }
 
-    def _epjc(self):
-        text = """\\documentclass[twocolumn,epjc3]{svjour3}
+    def _epjc_text(self):
+        yield """\\documentclass[twocolumn,epjc3]{svjour3}
 \\usepackage[T5,T1]{fontenc}
 \\journalname{Eur. Phys. J. C}
 
 \\begin{document}
 
 \\title{"""+self.collab+""" Author List for EPJC """
-        text += self.date.replace('-','')
-        text += """}
+        yield self.title_date
+        yield """}
 \\onecolumn
 \\author{"""
         first = True
-        for author in self.authors:
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
             if first:
                 first = False
             else:
-                text += '\\and '
-            text += utf8tolatex(author['authname'])
-            source = []
-            if 'instnames' in author and author['instnames']:
-                source.extend(sorted(author['instnames'], key=self.sorted_insts.index))
-            if 'thanks' in author and author['thanks']:
-                source.extend(chr(ord('a') + self.sorted_thanks.index(t)) for t in sorted(author['thanks'], key=self.sorted_thanks.index))
+                yield '\\and '
+            yield utf8tolatex(author['authname'])
+            source = list(instnames)
+            source.extend(self.thanks_letters[t] for t in thanks)
             if source:
-                text += '\\thanksref{' + utf8tolatex(','.join(source)) + '}'
-            text += '\n'
-        text += '}\n\\authorrunning{'+self.collab+' Collaboration}\n'
+                yield '\\thanksref{' + utf8tolatex(','.join(source)) + '}'
+            yield '\n'
+        yield '}\n\\authorrunning{'+self.collab+' Collaboration}\n'
         for i,name in enumerate(self.sorted_thanks):
-            text += '\\thankstext{' + chr(ord('a') + i) + '}{'
-            text += utf8tolatex(self.thanks[name]) + '}\n'
+            yield '\\thankstext{' + chr(ord('a') + i) + '}{'
+            yield utf8tolatex(self.thanks[name]) + '}\n'
         if self.sorted_insts:
-            text += '\\institute{'
+            yield '\\institute{'
             first = True
             for name in self.sorted_insts:
                 if first:
                     first = False
                 else:
-                    text += '\\and '
-                text += utf8tolatex(self.insts[name]['cite'])
-                text += ' \\label{' + name + '}\n'
-            text += '}\n'
-        text += """\\date{Received: date / Accepted: date}
+                    yield '\\and '
+                yield utf8tolatex(self.insts[name]['cite'])
+                yield ' \\label{' + name + '}\n'
+            yield '}\n'
+        yield """\\date{Received: date / Accepted: date}
 \\maketitle
 \\twocolumn
 \\begin{acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{acknowledgements}
 
 \\end{document}"""
 
+    def _epjc(self):
         intro_text = """This style for European Physical Journal C.
 You will need svjour3.cls and svepjc3.clo from
 <a href="/static/svjour3-epjc.zip">svjour3-epjc.zip</a>
@@ -271,37 +503,35 @@ You will need svjour3.cls and svepjc3.clo from
 """
 
         return {
-            'format_text': text,
+            'format_text': self._epjc_text(),
             'intro_text': intro_text,
         }
 
-    def _revtex4(self):
-        text = """\\documentclass[aps,prl,superscriptaddress]{revtex4-1}
+    def _revtex4_text(self):
+        yield """\\documentclass[aps,prl,superscriptaddress]{revtex4-1}
 \\usepackage[T5,T1]{fontenc}
 \\begin{document}
 
 \\title{"""+self.collab+""" Author List for Rev{\\TeX} """
-        text += self.date.replace('-','') + '}\n\n'
+        yield self.title_date + '}\n\n'
         for name in self.sorted_insts:
-            text += '\\affiliation{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
-        text += '\n'
-        for author in self.authors:
-            text += '\\author{'
-            text += utf8tolatex(author['authname'])
-            text += '}\n'
-            if 'thanks' in author:
-                for name in sorted(author['thanks'], key=self.sorted_thanks.index):
-                    text += '\\thanks{'
-                    text += utf8tolatex(self.thanks[name])
-                    text += '}\n'
-            if 'instnames' in author:
-                for name in sorted(author['instnames'], key=self.sorted_insts.index):
-                    text += '\\affiliation{'
-                    text += utf8tolatex(self.insts[name]['cite'])
-                    text += '}\n'
-        text += """\\date{\\today}
+            yield '\\affiliation{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
+        yield '\n'
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
+            yield '\\author{'
+            yield utf8tolatex(author['authname'])
+            yield '}\n'
+            for name in thanks:
+                yield '\\thanks{'
+                yield utf8tolatex(self.thanks[name])
+                yield '}\n'
+            for name in instnames:
+                yield '\\affiliation{'
+                yield utf8tolatex(self.insts[name]['cite'])
+                yield '}\n'
+        yield """\\date{\\today}
 
 \\collaboration{"""+self.collab+""" Collaboration}
 \\noaffiliation
@@ -310,12 +540,13 @@ You will need svjour3.cls and svepjc3.clo from
 
 \\begin{acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{acknowledgements}
 
 \\end{document}"""
 
+    def _revtex4(self):
         intro_text = """This style e.g. for Physical Review Letters.
 You will need revtex4.cls and revsymb.sty as well as possibly
 some *.rtx files from the
@@ -323,42 +554,40 @@ some *.rtx files from the
 """
 
         return {
-            'format_text': text,
+            'format_text': self._revtex4_text(),
             'intro_text': intro_text,
         }
 
-    def _aastex(self):
+    def _aastex_text(self):
         ### New ApJ 6.3 formatting
-        text = """\\documentclass[twocolumn]{aastex63}
+        yield """\\documentclass[twocolumn]{aastex63}
 \\usepackage[T5,T1]{fontenc}
 \\begin{document}
 
 \\title{"""+self.collab+""" Author List for AAS{\\TeX} """
-        text += self.date.replace('-','') + '}\n\n'
+        yield self.title_date + '}\n\n'
         for name in self.sorted_insts:
-            text += '\\affiliation{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
-        text += '\n'
-        for author in self.authors:
-            text += '\\author'
+            yield '\\affiliation{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
+        yield '\n'
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
+            yield '\\author'
             if 'orcid' in author and author['orcid']:
-                text += f'[{author["orcid"]}]'
-            text += '{'
-            text += utf8tolatex(author['authname'])
-            text += '}\n'
-            if 'thanks' in author:
-                for name in sorted(author['thanks'], key=self.sorted_thanks.index):
-                    text += '\\altaffiliation{'
-                    text += utf8tolatex(self.thanks[name])
-                    text += '}\n'
-            if 'instnames' in author:
-                for name in sorted(author['instnames'], key=self.sorted_insts.index):
-                    text += '\\affiliation{'
-                    text += utf8tolatex(self.insts[name]['cite'])
-                    text += '}\n'
-            text += '\n'
-        text += """\\date{\\today}
+                yield f'[{author["orcid"]}]'
+            yield '{'
+            yield utf8tolatex(author['authname'])
+            yield '}\n'
+            for name in thanks:
+                yield '\\altaffiliation{'
+                yield utf8tolatex(self.thanks[name])
+                yield '}\n'
+            for name in instnames:
+                yield '\\affiliation{'
+                yield utf8tolatex(self.insts[name]['cite'])
+                yield '}\n'
+            yield '\n'
+        yield """\\date{\\today}
 
 \\collaboration{"""+str(len(self.authors))+"}{"+self.collab+""" Collaboration}
 
@@ -374,11 +603,12 @@ Text body goes here.
 
 \\section*{Acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 
 \\end{document}"""
 
+    def _aastex(self):
         intro_text = """This style e.g. for Astroparticle Journal.
 You will need aastex63.cls and aasjournal.bst as well as possibly
 some other files from the
@@ -386,45 +616,43 @@ some other files from the
 """
 
         return {
-            'format_text': text,
+            'format_text': self._aastex_text(),
             'intro_text': intro_text,
         }
 
-    def _aastex7(self):
+    def _aastex7_text(self):
         ### AASTeX 7 formatting
-        text = """\\documentclass[twocolumn]{aastex701}
+        yield """\\documentclass[twocolumn]{aastex701}
 \\usepackage[T5,T1]{fontenc}
 \\begin{document}
 
 \\title{"""+self.collab+""" Author List for AAS{\\TeX} """
-        text += self.date.replace('-','') + '}\n\n'
+        yield self.title_date + '}\n\n'
         for name in self.sorted_insts:
-            text += '\\affiliation{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
-        text += '\n'
-        for author in self.authors:
-            text += '\\author'
+            yield '\\affiliation{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
+        yield '\n'
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
+            yield '\\author'
             if 'orcid' in author and author['orcid']:
-                text += f'[{author["orcid"]}]'
-            text += '{'
-            text += utf8tolatex(author['authname'])
-            text += '}\n'
-            if 'thanks' in author:
-                for name in sorted(author['thanks'], key=self.sorted_thanks.index):
-                    text += '\\altaffiliation{'
-                    text += utf8tolatex(self.thanks[name])
-                    text += '}\n'
-            if 'instnames' in author:
-                for name in sorted(author['instnames'], key=self.sorted_insts.index):
-                    text += '\\affiliation{'
-                    text += utf8tolatex(self.insts[name]['cite'])
-                    text += '}\n'
-            text += '\\email{'
-            text += utf8tolatex(author['email'] if author.get('email') else 'analysis@icecube.wisc.edu')
-            text += '}\n'
-            text += '\n'
-        text += """\\date{\\today}
+                yield f'[{author["orcid"]}]'
+            yield '{'
+            yield utf8tolatex(author['authname'])
+            yield '}\n'
+            for name in thanks:
+                yield '\\altaffiliation{'
+                yield utf8tolatex(self.thanks[name])
+                yield '}\n'
+            for name in instnames:
+                yield '\\affiliation{'
+                yield utf8tolatex(self.insts[name]['cite'])
+                yield '}\n'
+            yield '\\email{'
+            yield utf8tolatex(author['email'] if author.get('email') else 'analysis@icecube.wisc.edu')
+            yield '}\n'
+            yield '\n'
+        yield """\\date{\\today}
 
 \\collaboration{"""+str(len(self.authors))+"}{"+self.collab+""" Collaboration}
 
@@ -440,18 +668,19 @@ Text body goes here.
 
 \\section*{Acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 
 \\end{document}"""
 
+    def _aastex7(self):
         intro_text = """This style uses AASTeX 7.0.1 formatting.
     You will need the aastex7 class and related files from the 
     <a href="https://journals.aas.org/wp-content/uploads/2025/05/aastex701-1.zip">AASTeX 7.0.1 Distribution files</a> on the <a href="https://journals.aas.org/aastex-package-for-manuscript-preparation/">AAS journals package page</a>.
     """
 
         return {
-            'format_text': text,
+            'format_text': self._aastex7_text(),
             'intro_text': intro_text,
         }
 
@@ -505,221 +734,216 @@ Text body goes here.
             'intro_text': intro_text,
         }
 
-    def _aa(self):
-        text = """\\documentclass[longauth]{aa}
+    def _aa_text(self):
+        yield """\\documentclass[longauth]{aa}
 \\usepackage{txfonts}
 \\usepackage[T5,T1]{fontenc}
 \\begin{document}
 \\title{"""+self.collab+""" Author List for A \\& A """
-        text += self.date.replace('-','')
-        text += """}
+        yield self.title_date
+        yield """}
 \\author{
 """+self.collab+""" Collaboration:
 """
         first = True
-        for author in self.authors:
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
             if first:
                 first = False
             else:
-                text += '\\and '
-            text += utf8tolatex(author['authname'])
-            source = []
-            if 'instnames' in author and author['instnames']:
-                source.extend(sorted(author['instnames'], key=self.sorted_insts.index))
-            if 'thanks' in author and author['thanks']:
-                source.extend(chr(ord('a') + self.sorted_thanks.index(t)) for t in sorted(author['thanks'], key=self.sorted_thanks.index))
+                yield '\\and '
+            yield utf8tolatex(author['authname'])
+            source = list(instnames)
+            source.extend(self.thanks_letters[t] for t in thanks)
             if source:
-                text += '\\inst{' + ','.join('\\ref{'+utf8tolatex(s)+'}' for s in source) + '}'
-            text += '\n'
-        text += '}\n'
+                yield '\\inst{' + ','.join('\\ref{'+utf8tolatex(s)+'}' for s in source) + '}'
+            yield '\n'
+        yield '}\n'
         if self.sorted_insts or self.sorted_thanks:
-            text += '\\institute{'
+            yield '\\institute{'
             first = True
             for name in self.sorted_insts:
                 if first:
                     first = False
                 else:
-                    text += '\\and '
-                text += utf8tolatex(self.insts[name]['cite'])
-                text += ' \\label{' + name + '} \n'
+                    yield '\\and '
+                yield utf8tolatex(self.insts[name]['cite'])
+                yield ' \\label{' + name + '} \n'
             for i,name in enumerate(self.sorted_thanks):
                 if first:
                     first = False
                 else:
-                    text += '\\and '
-                text += utf8tolatex(self.thanks[name])
-                text += '\\label{' + chr(ord('a') + i) + '} \n'
-            text += '}\n'
-        text += """\\abstract { } { } { } { } { }
+                    yield '\\and '
+                yield utf8tolatex(self.thanks[name])
+                yield '\\label{' + chr(ord('a') + i) + '} \n'
+            yield '}\n'
+        yield """\\abstract { } { } { } { } { }
 \\keywords{keword 1 -- keyword 2 -- keyword 3}
 \\maketitle
 \\begin{acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{acknowledgements}
 \\end{document}"""
 
+    def _aa(self):
         intro_text = """For the Journal Astronomy & Astrophysics.
 You will need <a href="http://ftp.edpsciences.org/pub/aa/aa.cls">aa.cls</a>
 but also consult the journal pages for more author instructions.
 """
 
         return {
-            'format_text': text,
+            'format_text': self._aa_text(),
             'intro_text': intro_text,
         }
 
-    def _elsevier(self):
-        text = """\\documentclass[preprint,12pt]{elsarticle}
+    def _elsevier_text(self):
+        yield """\\documentclass[preprint,12pt]{elsarticle}
 \\usepackage[T5,T1]{fontenc}
 \\journal{Astroparticle Physics}
 \\begin{document}
 \\begin{frontmatter}
 \\title{"""+self.collab+""" Author List for Elsevier """
-        text += self.date.replace('-','') + '}\n\n'
-        text += '\n'
-        for author in self.authors:
-            text += '\\author'
+        yield self.title_date + '}\n\n'
+        yield '\n'
+        for author, (instnames, thanks) in zip(self.authors, self.affiliations):
+            yield '\\author'
             if 'instnames' in author:
-                text += '['+(','.join(sorted(author['instnames'], key=self.sorted_insts.index)))+']'
-            text += '{'
-            text += utf8tolatex(author['authname'])
-            if 'thanks' in author and author['thanks']:
-                text += '\\fnref{'
-                text += ','.join(sorted(author['thanks'], key=self.sorted_thanks.index))
-                text += '}'
-            text += '}\n'
+                yield '['+(','.join(instnames))+']'
+            yield '{'
+            yield utf8tolatex(author['authname'])
+            if thanks:
+                yield '\\fnref{'
+                yield ','.join(thanks)
+                yield '}'
+            yield '}\n'
         for name in self.sorted_insts:
-            text += '\\address['+name+']{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
+            yield '\\address['+name+']{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
         for name in self.thanks:
-            text += '\\fntext['+name+']{'
-            text += utf8tolatex(self.thanks[name])
-            text += '}\n'
-        text += """\\end{frontmatter}
+            yield '\\fntext['+name+']{'
+            yield utf8tolatex(self.thanks[name])
+            yield '}\n'
+        yield """\\end{frontmatter}
 
 \\section*{acknowledgements}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{document}"""
 
+    def _elsevier(self):
         intro_text = """This style e.g. for Astroparticle Physics, or other Elsevier journals.
 You will need elsarticle from the
 <a href="http://www.ctan.org/tex-archive/macros/latex/contrib/elsarticle">CTAN library</a>.
 """
 
         return {
-            'format_text': text,
+            'format_text': self._elsevier_text(),
             'intro_text': intro_text,
         }
 
-    def _jhep(self):
-        text = """\\documentclass[preprint,12pt]{article}
+    def _jhep_text(self):
+        yield """\\documentclass[preprint,12pt]{article}
 \\usepackage{jheppub}
 \\usepackage[T5,T1]{fontenc}
 \\title{"""+self.collab+""" Author List for JHEP/JCAP """
-        text += self.date.replace('-','') + '}\n\n'
-        text += '\n'
-        for i,author in enumerate(self.authors):
-            text += '\\author'
-            source = []
-            if 'instnames' in author and author['instnames']:
-                source.extend(str(self.sorted_insts.index(n)) for n in sorted(author['instnames'], key=self.sorted_insts.index))
-            if 'thanks' in author and author['thanks']:
-                source.extend(chr(ord('a') + self.sorted_thanks.index(t)) for t in sorted(author['thanks'], key=self.sorted_thanks.index))
+        yield self.title_date + '}\n\n'
+        yield '\n'
+        for i,(author, (instnames, thanks)) in enumerate(zip(self.authors, self.affiliations)):
+            yield '\\author'
+            source = [str(self.inst_numbers[n]) for n in instnames]
+            source.extend(self.thanks_letters[t] for t in thanks)
             if source:
-                text += '[' + ','.join(source) + ']'
-            text += '{'
+                yield '[' + ','.join(source) + ']'
+            yield '{'
             if i+1 == len(self.authors):
-                text += 'and '
-            text += utf8tolatex(author['authname'])
+                yield 'and '
+            yield utf8tolatex(author['authname'])
             if i+1 < len(self.authors):
-                text += ','
-            text += '}\n'
-        for name in self.sorted_insts:
-            text += '\\affiliation['+str(self.sorted_insts.index(name))+']{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
+                yield ','
+            yield '}\n'
+        for i,name in enumerate(self.sorted_insts):
+            yield '\\affiliation['+str(i)+']{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
         for name in self.thanks:
-            text += '\\affiliation['+chr(ord('a') + self.sorted_thanks.index(name))+']{'
-            text += utf8tolatex(self.thanks[name])
-            text += '}\n'
-        text += """
+            yield '\\affiliation['+self.thanks_letters[name]+']{'
+            yield utf8tolatex(self.thanks[name])
+            yield '}\n'
+        yield """
 
 \\begin{document}
 \\maketitle
 \\acknowledgments
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{document}"""
 
+    def _jhep(self):
         intro_text = """This style e.g. for Journal of High Energy Physics, or Journal of Cosmology and Astroparticle Phsics.
 You will need jheppub from
 <a href="https://jhep.sissa.it/jhep/help/JHEP_TeXclass.jsp">here</a>.
 """
 
         return {
-            'format_text': text,
+            'format_text': self._jhep_text(),
             'intro_text': intro_text,
         }
 
-    def _jinst(self):
-        text = """\\documentclass[11pt,a4paper]{article}
+    def _jinst_text(self):
+        yield """\\documentclass[11pt,a4paper]{article}
 \\usepackage{jinstpub}
 \\usepackage[T5,T1]{fontenc}
 \\title{"""+self.collab+""" Author List for JINST """
-        text += self.date.replace('-','') + '}\n\n'
-        text += '\n'
-        for i,author in enumerate(self.authors):
-            text += '\\author'
-            source = []
-            if 'instnames' in author and author['instnames']:
-                source.extend(str(self.sorted_insts.index(n)) for n in sorted(author['instnames'], key=self.sorted_insts.index))
-            if 'thanks' in author and author['thanks']:
-                source.extend(chr(ord('a') + self.sorted_thanks.index(t)) for t in sorted(author['thanks'], key=self.sorted_thanks.index))
+        yield self.title_date + '}\n\n'
+        yield '\n'
+        for i,(author, (instnames, thanks)) in enumerate(zip(self.authors, self.affiliations)):
+            yield '\\author'
+            source = [str(self.inst_numbers[n]) for n in instnames]
+            source.extend(self.thanks_letters[t] for t in thanks)
             if source:
-                text += '[' + ','.join(source) + ']'
-            text += '{'
+                yield '[' + ','.join(source) + ']'
+            yield '{'
             if i+1 == len(self.authors):
-                text += 'and '
-            text += utf8tolatex(author['authname'])
+                yield 'and '
+            yield utf8tolatex(author['authname'])
             if i+1 < len(self.authors):
-                text += ','
-            text += '}\n'
-        for name in self.sorted_insts:
-            text += '\\affiliation['+str(self.sorted_insts.index(name))+']{'
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += '}\n'
+                yield ','
+            yield '}\n'
+        for i,name in enumerate(self.sorted_insts):
+            yield '\\affiliation['+str(i)+']{'
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield '}\n'
         for name in self.thanks:
-            text += '\\affiliation['+chr(ord('a') + self.sorted_thanks.index(name))+']{'
-            text += utf8tolatex(self.thanks[name])
-            text += '}\n'
-        text += """
+            yield '\\affiliation['+self.thanks_letters[name]+']{'
+            yield utf8tolatex(self.thanks[name])
+            yield '}\n'
+        yield """
 
 \\begin{document}
 \\maketitle
 \\acknowledgments
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """
+        yield latex_acks(self.acks)
+        yield """
 \\end{document}"""
 
+    def _jinst(self):
         intro_text = """This style e.g. for Journal of Instrumentation.
 You will need jinstpub from
 <a href="https://jinst.sissa.it/jinst/help/JINST_TeXclass.jsp">here</a>.
 """
 
         return {
-            'format_text': text,
+            'format_text': self._jinst_text(),
             'intro_text': intro_text,
         }
 
-    def _science(self):
-        text = """\\documentclass[12pt]{article}
+    def _science_text(self):
+        yield """\\documentclass[12pt]{article}
 \\usepackage{scicite}
 \\usepackage{times}
 \\usepackage[T5,T1]{fontenc}
@@ -735,7 +959,7 @@ You will need jinstpub from
 {\\end{quote}}
 
 \\title{"""+self.collab+""" Author List for Science """
-        text += self.date.replace('-','') + """}
+        yield self.title_date + """}
 
 \\author{"""+self.collab+""" Collaboration\\footnote{The full list of collaboration members and their affiliations is included in the supplementary material}
 \\footnote{Correspondence to analysis@icecube.wisc.edu}\\\\
@@ -769,8 +993,8 @@ Materials and Methods\\\\
 
 {\\bf Funding:}
 """
-        text += '\n'.join(utf8tolatex(a) for a in self.acks)
-        text += """\\\\
+        yield latex_acks(self.acks)
+        yield """\\\\
 
 {\\bf Author contributions:}
 The IceCube Collaboration designed, constructed and now operates the IceCube Neutrino Observatory. Data processing and calibration, Monte Carlo simulations of the detector and of theoretical models, and data analyses were performed by a large number of collaboration members, who also discussed and approved the scientific results presented here. The manuscript was reviewed by the entire collaboration before publication, and all authors approved the final version.\\\\
@@ -787,52 +1011,50 @@ Additional data and resources are available from the IceCube data archive at \\u
 \\Large{
 Supplementary Materials for:\\\\
 """+self.collab+""" Author List for Science """
-        text += self.date.replace('-','') + """
+        yield self.title_date + """
 }
 \\end{center}
 
 \\subsection*{"""+self.collab+""" Collaboration$^{\\ast}$:}
 
 """
-        for i,author in enumerate(self.authors):
-            source = []
-            if 'instnames' in author and author['instnames']:
-                source.extend(str(1+self.sorted_insts.index(n)) for n in sorted(author['instnames'], key=self.sorted_insts.index))
-            if 'thanks' in author and author['thanks']:
-                source.extend(str(1+len(self.sorted_insts) + self.sorted_thanks.index(t)) for t in sorted(author['thanks'], key=self.sorted_thanks.index))
-            text += utf8tolatex(author['authname'])
+        for i,(author, (instnames, thanks)) in enumerate(zip(self.authors, self.affiliations)):
+            source = [str(1+self.inst_numbers[n]) for n in instnames]
+            source.extend(str(1+len(self.sorted_insts) + self.thanks_numbers[t]) for t in thanks)
+            yield utf8tolatex(author['authname'])
             if source:
-                text += '$^{' + ',\\: '.join(source) + '}$'
+                yield '$^{' + ',\\: '.join(source) + '}$'
             if i+1 < len(self.authors):
-                text += ','
-            text += '\n'
-        text += '\\\\\n\\\\\n'
-        for name in self.sorted_insts:
-            text += '$^{'+str(1+self.sorted_insts.index(name))+'}$ '
-            text += utf8tolatex(self.insts[name]['cite'])
-            text += ' \\\\\n'
+                yield ','
+            yield '\n'
+        yield '\\\\\n\\\\\n'
+        for i,name in enumerate(self.sorted_insts):
+            yield '$^{'+str(1+i)+'}$ '
+            yield utf8tolatex(self.insts[name]['cite'])
+            yield ' \\\\\n'
         for name in self.thanks:
-            text += '$^{'+str(1+len(self.sorted_insts) + self.sorted_thanks.index(name))+'}$ '
-            text += utf8tolatex(filter_thanks(self.thanks[name])[1])
-            text += ' \\\\\n'
-        text += """\\\\
+            yield '$^{'+str(1+len(self.sorted_insts) + self.thanks_numbers[name])+'}$ '
+            yield utf8tolatex(filter_thanks(self.thanks[name])[1])
+            yield ' \\\\\n'
+        yield """\\\\
 $^\\ast$E-mail: analysis@icecube.wisc.edu
 
 \\section*{Materials and Methods}
 
 \\end{document}"""
 
+    def _science(self):
         intro_text = """This style for <i>Science</i>. You will need style and bib files from
 <a href="https://www.sciencemag.org/authors/preparing-manuscripts-using-latex">here</a>.
 """
 
         return {
-            'format_text': text,
+            'format_text': self._science_text(),
             'intro_text': intro_text,
         }
 
-    def _inspire(self):
-        text = """<?xml version="1.0" encoding="UTF-8"?>
+    def _inspire_text(self):
+        yield """<?xml version="1.0" encoding="UTF-8"?>
 
 <!DOCTYPE collaborationauthorlist SYSTEM "author.dtd">
 <!--
@@ -840,9 +1062,9 @@ $^\\ast$E-mail: analysis@icecube.wisc.edu
 -->
 <collaborationauthorlist xmlns:foaf="http://xmlns.com/foaf/0.1/" \
 xmlns:cal="http://inspirehep.net/info/HepNames/tools/authors_xml/">\n\n"""
-        text += f'  <cal:creationDate>{self.date}</cal:creationDate>\n'
-        text += '  <cal:publicationReference>XXXX-REPLACE-ME-XXXX</cal:publicationReference>\n\n'
-        text += f"""  <cal:collaborations>
+        yield f'  <cal:creationDate>{self.date}</cal:creationDate>\n'
+        yield '  <cal:publicationReference>XXXX-REPLACE-ME-XXXX</cal:publicationReference>\n\n'
+        yield f"""  <cal:collaborations>
     <cal:collaboration id="c1">
       <foaf:name>{self.collab}</foaf:name>
     </cal:collaboration>
@@ -850,16 +1072,16 @@ xmlns:cal="http://inspirehep.net/info/HepNames/tools/authors_xml/">\n\n"""
 
   <cal:organizations>\n"""
         for i,name in enumerate(self.sorted_insts):
-            text += '    <foaf:Organization id="a{}">\n'.format(1+i)
-            text += '      <foaf:name>{}</foaf:name>\n'.format(xhtml_escape(self.insts[name]['cite']))
-            text += '      <cal:orgStatus collaborationid="c1">member</cal:orgStatus>\n'
-            text += '    </foaf:Organization>\n'
+            yield '    <foaf:Organization id="a{}">\n'.format(1+i)
+            yield '      <foaf:name>{}</foaf:name>\n'.format(xhtml_escape(self.insts[name]['cite']))
+            yield '      <cal:orgStatus collaborationid="c1">member</cal:orgStatus>\n'
+            yield '    </foaf:Organization>\n'
         for i,name in enumerate(self.thanks):
-            text += '    <foaf:Organization id="a{}">\n'.format(1+i+len(self.sorted_insts))
-            text += '      <foaf:name>{}</foaf:name>\n'.format(xhtml_escape(filter_thanks(self.thanks[name])[1]))
-            text += '      <cal:orgStatus collaborationid="c1">nonmember</cal:orgStatus>\n'
-            text += '    </foaf:Organization>\n'
-        text += """  </cal:organizations>
+            yield '    <foaf:Organization id="a{}">\n'.format(1+i+len(self.sorted_insts))
+            yield '      <foaf:name>{}</foaf:name>\n'.format(xhtml_escape(filter_thanks(self.thanks[name])[1]))
+            yield '      <cal:orgStatus collaborationid="c1">nonmember</cal:orgStatus>\n'
+            yield '    </foaf:Organization>\n'
+        yield """  </cal:organizations>
 
   <cal:authors>\n"""
         for author in self.authors:
@@ -869,53 +1091,55 @@ xmlns:cal="http://inspirehep.net/info/HepNames/tools/authors_xml/">\n\n"""
                 last = author['authname'].rsplit('. ', 1)[-1]
             email = author['email'] if 'email' in author else ''
 
-            text += '    <foaf:Person>\n'
-            text += '      <cal:authorNameNative>{}</cal:authorNameNative>\n'.format(author['first']+' '+author['last'])
+            yield '    <foaf:Person>\n'
+            yield '      <cal:authorNameNative>{}</cal:authorNameNative>\n'.format(author['first']+' '+author['last'])
             if 'first' in author:
-                text += '      <foaf:givenName>{}</foaf:givenName>\n'.format(unidecode.unidecode(author['first']))
-            text += '      <foaf:familyName>{}</foaf:familyName>\n'.format(unidecode.unidecode(last))
-            text += '      <cal:authorNamePaper>{}</cal:authorNamePaper>\n'.format(unidecode.unidecode(author['authname']))
-            text += '      <cal:authorCollaboration collaborationid="c1" />\n'
-            text += '      <cal:authorAffiliations>\n'
+                yield '      <foaf:givenName>{}</foaf:givenName>\n'.format(unidecode.unidecode(author['first']))
+            yield '      <foaf:familyName>{}</foaf:familyName>\n'.format(unidecode.unidecode(last))
+            yield '      <cal:authorNamePaper>{}</cal:authorNamePaper>\n'.format(unidecode.unidecode(author['authname']))
+            yield '      <cal:authorCollaboration collaborationid="c1" />\n'
+            yield '      <cal:authorAffiliations>\n'
             source = []
             if 'instnames' in author:
-                source.extend({'id': 1+self.sorted_insts.index(t)} for t in author['instnames'])
+                source.extend({'id': 1+self.inst_numbers[t]} for t in author['instnames'] if t in self.inst_numbers)
             if 'thanks' in author:
-                source.extend({'id': 1+len(self.sorted_insts)+self.sorted_thanks.index(t), 'connection': filter_thanks(self.thanks[t])[0].capitalize()} for t in author['thanks'])
+                source.extend({'id': 1+len(self.sorted_insts)+self.thanks_numbers[t], 'connection': filter_thanks(self.thanks[t])[0].capitalize()} for t in author['thanks'] if t in self.thanks)
             for s in source:
-                text += f'        <cal:authorAffiliation organizationid="a{s["id"]}" '
+                yield f'        <cal:authorAffiliation organizationid="a{s["id"]}" '
                 if 'connection' in s and s['connection']:
-                    text += f'connection="{s["connection"]}" '
-                text += '/>\n'
-            text += '      </cal:authorAffiliations>\n'
-            text += '      <cal:authorids>\n'
-            text += f'        <cal:authorid source="INTERNAL">{author["email"]}</cal:authorid>\n'
+                    yield f'connection="{s["connection"]}" '
+                yield '/>\n'
+            yield '      </cal:authorAffiliations>\n'
+            yield '      <cal:authorids>\n'
+            yield f'        <cal:authorid source="INTERNAL">{author["email"]}</cal:authorid>\n'
             if 'orcid' in author and author['orcid']:
-                text += f'        <cal:authorid source="ORCID">{author["orcid"]}</cal:authorid>\n'
-            text += '      </cal:authorids>\n'
-            text += '    </foaf:Person>\n'
-        text += """  </cal:authors>
+                yield f'        <cal:authorid source="ORCID">{author["orcid"]}</cal:authorid>\n'
+            yield '      </cal:authorids>\n'
+            yield '    </foaf:Person>\n'
+        yield """  </cal:authors>
 </collaborationauthorlist>\n"""
 
+    def _inspire(self):
         intro_text = 'This style for <a href="https://inspirehep.net/help/knowledge-base/authorxml/">INSPIRE authors.xml</a>.'
 
         return {
-            'format_text': xhtml_escape(text),
+            'format_text': self._inspire_text(),
             'intro_text': intro_text,
         }
 
     def _json(self):
+        authors = [author.to_dict() for author in self.authors]
+        dicts = {id(author): d for author,d in zip(self.authors, authors)}
         authors_by_inst = defaultdict(list)
-        for author in self.authors:
-            for instname in author['instnames']:
-                authors_by_inst[instname].append(author)
+        for instname, inst_authors in self.authors_by_inst.items():
+            authors_by_inst[instname] = [dicts[id(a)] for a in inst_authors]
         keycloak_mapping = {}
         if self.collab == 'IceCube':
             keycloak_mapping = keycloak_utils.IceCube.authorlist_insts_to_groups
         elif self.collab == 'IceCube-Gen2':
             keycloak_mapping = keycloak_utils.IceCubeGen2.authorlist_insts_to_groups
         ret = {
-            'authors': self.authors,
+            'authors': authors,
             'authors_by_inst': authors_by_inst,
             'insts': self.insts,
             'sorted_insts': self.sorted_insts,
@@ -924,22 +1148,113 @@ xmlns:cal="http://inspirehep.net/info/HepNames/tools/authors_xml/">\n\n"""
             'sorted_thanks': self.sorted_thanks,
             'acks': self.acks,
         }
-        ret['format_text'] = json.dumps(ret, indent=2, ensure_ascii=False)
+        ret['format_text'] = json.JSONEncoder(indent=2, ensure_ascii=False).iterencode(dict(ret))
         ret['intro_text'] = 'JSON structured data dump'
         return ret
 
 
-class BaseHandler(tornado.web.RequestHandler):
-    def initialize(self, state, collab=None):
-        self.state = state
+@functools.lru_cache(maxsize=None)
+def render_version():
+    """
+    Hash the code and templates that render the output.
+
+    It is part of the ETag, so a deploy that changes the output
+    does not answer If-None-Match with a 304.
+
+    Returns: str
+    """
+    h = hashlib.sha256(layout_hash().encode('utf-8'))
+    package = os.path.dirname(__file__)
+    template_path = os.path.join(package, 'templates')
+    filenames = [os.path.join(package, name) for name in ('__init__.py', 'handlers.py', 'output.py')]
+    filenames += [os.path.join(template_path, name) for name in sorted(os.listdir(template_path))]
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class ConditionalMixin:
+    """Answer conditional GETs before rendering anything."""
+    def not_modified(self, state, date, *args):
+        """
+        Set the ETag and Last-Modified headers, and check the request against them.
+
+        The list for a date can change when the date starts, even if the
+        data did not, so Last-Modified is the later of the two.  That way
+        a list for "today" is not reused on the next day.
+
+        Args:
+            state (State): the state the response is rendered from
+            date (str): the query date, in ISO 8601 string format
+            *args: everything else the response depends on
+
+        Returns: bool, True if the client's copy is current
+        """
+        key = (render_version(), state.content_hash, date)+args
+        tag = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        modified = max(state.modified.replace(microsecond=0), datetime.fromisoformat(date[:10]))
+        self.set_header('Etag', f'"{tag}"')
+        self.set_header('Last-Modified', modified)
+        if self.request.method not in ('GET', 'HEAD'):
+            return False
+        if 'If-None-Match' in self.request.headers:
+            return self.check_etag_header()
+        since = self.request.headers.get('If-Modified-Since')
+        if since:
+            since = email.utils.parsedate(since)
+            if since and modified <= datetime(*since[:6]):
+                return True
+        return False
+
+
+class StreamingMixin:
+    """Write a response as it is rendered."""
+    async def write_stream(self, chunks, head=b'', tail=b''):
+        """
+        Write chunks of output, flushing each one.
+
+        The first chunk is rendered before anything is written, so
+        early errors still get an error response.  Later errors close
+        the connection, since a finished 200 response would look
+        complete to the client and its caches.
+
+        Args:
+            chunks (iterable): chunks of output
+            head (bytes): (optional) output before the chunks
+            tail (bytes): (optional) output after the chunks
+        """
+        chunks = iter(chunks)
+        first = next(chunks, '')
+        self.write(head)
+        self.write(first)
+        await self.flush()
+        try:
+            for chunk in chunks:
+                self.write(chunk)
+                await self.flush()
+        except Exception:
+            self.request.connection.close()
+            raise
+        self.finish(tail)
+
+
+class BaseHandler(ConditionalMixin, StreamingMixin, tornado.web.RequestHandler):
+    def initialize(self, states, collab=None, cache=None):
+        # look up the state once per request, so a reload cannot change it mid-request
+        self.state = states[collab.lower()]
         self.collab = collab
+        self.cache = cache
 
 
 class CollabHandler(BaseHandler):
-    def get(self):
-        return self.post()
+    #: stands in for the format text when streaming it into a template
+    FORMAT_TEXT_MARKER = '\x00format_text\x00'
+
+    async def get(self):
+        return await self.post()
 
-    def common(self, date=''):
+    async def common(self, date=''):
         if not date:
             date = today()
 
@@ -947,7 +1262,15 @@ class CollabHandler(BaseHandler):
         formatting = self.get_argument('formatting','web') if raw is None else 'web'
         legacy = self.get_argument('legacy', False)
 
-        r = AuthorListRenderer(self.state)
+        if self.not_modified(self.state, date, self.collab, formatting, legacy, raw):
+            self.set_status(304)
+            return self.finish()
+
+        r = AuthorListRenderer(self.state, cache=self.cache)
+        if raw is None and formatting in r.STREAMING:
+            kwargs, chunks = r.render_stream(self.collab, date, formatting, legacy)
+            return await self.render_streaming('collab.html', chunks, **kwargs)
+
         kwargs = r.render(self.collab, date, formatting, legacy)
 
         if raw:
@@ -956,6 +1279,19 @@ class CollabHandler(BaseHandler):
         else:
             return self.render('collab.html', **kwargs)
 
+    async def render_streaming(self, template_name, chunks, **kwargs):
+        """
+        Render a template, streaming the `format_text` chunks into it.
+
+        Args:
+            template_name (str): template to render
+            chunks (iterable): chunks of format text
+            **kwargs: other template arguments
+        """
+        html = self.render_string(template_name, format_text=self.FORMAT_TEXT_MARKER, **kwargs)
+        head, tail = html.split(self.FORMAT_TEXT_MARKER.encode('utf-8'), 1)
+        await self.write_stream(chunks, head, tail)
+
 
 class IceCubeHandler(CollabHandler):
     def initialize(self, *args, **kwargs):
@@ -998,9 +1334,13 @@ class Gen2Handler(CollabHandler):
             date = GEN2_START_DATE
         return self.common(date)
 
-class APIAuthorHandler(tornado.web.RequestHandler):
-    def initialize(self, states):
+class APIAuthorHandler(ConditionalMixin, StreamingMixin, tornado.web.RequestHandler):
+    #: media type asking for a single format, like application/vnd.authorlist.web+json
+    FORMAT_MEDIA_TYPE = re.compile(r'application/vnd\.authorlist\.([\w-]+)\+json')
+
+    def initialize(self, states, cache=None):
         self.states = states
+        self.cache = cache
 
     def write_error(self, status_code=500, **kwargs):
         """Write out custom error json."""
@@ -1011,7 +1351,8 @@ class APIAuthorHandler(tornado.web.RequestHandler):
         self.write(data)
         self.finish()
 
-    def get(self):
+    def get_collab_date(self):
+        """Get the collab and query date, clamped to the collab's lifetime."""
         collab = self.get_argument('collab', 'IceCube')
         if collab not in ('IceCube', 'IceCube-PINGU', 'IceCube-Gen2'):
             raise tornado.web.HTTPError(400, reason='bad collaboration')
@@ -1027,13 +1368,61 @@ class APIAuthorHandler(tornado.web.RequestHandler):
             date = PINGU_END_DATE
         elif collab == 'IceCube-Gen2' and date < GEN2_START_DATE:
             date = GEN2_START_DATE
+        return collab, date
+
+    def accepted_formats(self):
+        """Get the formats asked for in the Accept header."""
+        ret = []
+        for media_range in self.request.headers.get('Accept', '').split(','):
+            media_type, *params = [p.strip() for p in media_range.split(';')]
+            match = self.FORMAT_MEDIA_TYPE.fullmatch(media_type.lower())
+            if not match or match.group(1) not in AuthorListRenderer.FORMATTING:
+                continue
+            q = 1.
+            for param in params:
+                name, _, value = param.partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.
+            if q > 0:
+                ret.append(match.group(1))
+        return ret
 
-        r = AuthorListRenderer(self.states[collab.lower()])
+    def get(self):
+        collab, date = self.get_collab_date()
+
+        r = AuthorListRenderer(self.states[collab.lower()], cache=self.cache)
         formatting = self.get_arguments('formatting')
+        if not formatting:
+            formatting = self.accepted_formats()
         if not formatting:
             formatting = r.FORMATTING
+        self.set_header('Vary', 'Accept')
+        if self.not_modified(r.state, date, collab, tuple(formatting)):
+            self.set_status(304)
+            return
 
         ret = {}
         for f in formatting:
             ret[f] = r.render(collab, date, f)
         self.write(ret)
+
+
+class APIRawAuthorHandler(APIAuthorHandler):
+    """Download a single format as a standalone document."""
+    async def get(self):
+        collab, date = self.get_collab_date()
+        formatting = self.get_argument('formatting', 'json')
+
+        r = AuthorListRenderer(self.states[collab.lower()], cache=self.cache)
+        if self.not_modified(r.state, date, collab, formatting, 'raw'):
+            self.set_status(304)
+            return
+        kwargs, chunks = r.render_stream(collab, date, formatting, raw=True)
+
+        media_type, ext = r.DOCUMENTS[formatting]
+        self.set_header('Content-Type', f'{media_type}; charset=UTF-8')
+        self.set_header('Content-Disposition', f'attachment; filename="{collab}-{date.replace("-","")}-{formatting}.{ext}"')
+        await self.write_stream(chunks)
@@ -0,0 +1,164 @@
+"""
+Indexes over the authorlist state.
+"""
+
+#: stand-in for the `to` date of an open-ended entry
+OPEN_DATE = '9999-12-31'
+
+
+class IntervalIndex:
+    """
+    Centered interval tree for "which entries are valid on a date".
+
+    Dates are `util.date_ordinal` integers, with `util.OPEN_ORDINAL`
+    for an open-ended `to`.  Intervals that end before they start are
+    never valid, so they are dropped.
+
+    Args:
+        intervals (iterable): (from, to, value) tuples
+    """
+    def __init__(self, intervals):
+        self._root = self._build([iv for iv in intervals if iv[0] <= iv[1]])
+
+    @classmethod
+    def _build(cls, intervals):
+        if not intervals:
+            return None
+        points = sorted(p for f,t,_ in intervals for p in (f,t))
+        center = points[len(points)//2]
+        left, right, here = [], [], []
+        for iv in intervals:
+            if iv[1] < center:
+                left.append(iv)
+            elif iv[0] > center:
+                right.append(iv)
+            else:
+                here.append(iv)
+        by_start = sorted(here, key=lambda iv: iv[0])
+        by_end = sorted(here, key=lambda iv: iv[1], reverse=True)
+        return (center, by_start, by_end, cls._build(left), cls._build(right))
+
+    def query(self, date):
+        """
+        Find all values valid on a date.
+
+        Args:
+            date (int): a date ordinal
+
+        Returns: list of values, in no particular order
+        """
+        ret = []
+        node = self._root
+        while node:
+            center, by_start, by_end, left, right = node
+            if date < center:
+                for f,t,v in by_start:
+                    if f > date:
+                        break
+                    ret.append(v)
+                node = left
+            elif date > center:
+                for f,t,v in by_end:
+                    if t < date:
+                        break
+                    ret.append(v)
+                node = right
+            else:
+                ret.extend(v for f,t,v in by_start)
+                break
+        return ret
+
+
+class AttributeIndex:
+    """
+    Secondary indexes over some attributes of keyed entries.
+
+    Each indexed attribute maps a value to the keys of the entries with
+    that value.  For list values, each element is indexed.  Queries
+    intersect the indexes of the queried attributes, smallest first,
+    then check every queried attribute on the remaining entries, so
+    attributes that are not indexed can be queried too.
+
+    Args:
+        attrs (iterable): names of attributes to index
+        entries (dict): (optional) key: entry dicts to start with
+    """
+    def __init__(self, attrs, entries=None):
+        self.attrs = tuple(attrs)
+        self._index = {attr: {} for attr in self.attrs}
+        self._indexed = {}
+        self._positions = {}
+        if entries:
+            for key, entry in entries.items():
+                self.add(key, entry)
+
+    @staticmethod
+    def _values(value):
+        return value if isinstance(value, (list, tuple)) else (value,)
+
+    def add(self, key, entry):
+        """
+        Index an entry, replacing any entry with the same key.
+
+        Args:
+            key (str): entry key
+            entry (dict): entry data
+        """
+        self.remove(key)
+        self._positions.setdefault(key, len(self._positions))
+        indexed = []
+        for attr in self.attrs:
+            if attr not in entry:
+                continue
+            for value in self._values(entry[attr]):
+                try:
+                    self._index[attr].setdefault(value, set()).add(key)
+                except TypeError:
+                    continue  # unhashable, so only found by checking
+                indexed.append((attr, value))
+        # what was indexed, since entries can be changed in place
+        self._indexed[key] = indexed
+
+    def remove(self, key):
+        """
+        Remove an entry from the indexes.
+
+        Args:
+            key (str): entry key
+        """
+        for attr, value in self._indexed.pop(key, ()):
+            keys = self._index[attr].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[attr][value]
+
+    def query(self, entries, attrs):
+        """
+        Find the entries that match all attrs.
+
+        Args:
+            entries (dict): key: entry dicts that were indexed
+            attrs (dict): attrs to match on
+
+        Returns: dict of key: entry, in `entries` order
+        """
+        if not attrs:
+            return dict(entries)
+        postings = []
+        for attr, value in attrs.items():
+            if attr not in self._index:
+                continue
+            for v in self._values(value):
+                try:
+                    postings.append(self._index[attr].get(v, ()))
+                except TypeError:
+                    pass
+        if postings:
+            postings.sort(key=len)
+            keys = set(postings[0]).intersection(*postings[1:])
+            keys = sorted((k for k in keys if k in entries), key=self._positions.__getitem__)
+        else:
+            keys = entries
+        attr_items = attrs.items()
+        return {k: entries[k] for k in keys if attr_items <= entries[k].items()}
@@ -0,0 +1,48 @@
+"""
+Output builders for rendered author lists.
+
+Formats produce their text as a sequence of fragments.  Fragments are
+either joined once into a string, or grouped into chunks for streaming,
+so building a document is linear in its size.
+"""
+
+#: default streaming chunk size, in characters
+CHUNK_SIZE = 64*1024
+
+
+def build(fragments):
+    """
+    Build a document from text fragments.
+
+    Args:
+        fragments (iterable): text fragments
+
+    Returns: str
+    """
+    return ''.join(fragments)
+
+
+def stream(fragments, chunk_size=CHUNK_SIZE):
+    """
+    Stream a document from text fragments.
+
+    Fragments are consumed as they are produced and joined into chunks
+    of at least `chunk_size` characters (except for the last one).
+
+    Args:
+        fragments (iterable): text fragments
+        chunk_size (int): minimum chunk size, in characters
+
+    Returns: iterator of str
+    """
+    buf = []
+    size = 0
+    for f in fragments:
+        buf.append(f)
+        size += len(f)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
@@ -0,0 +1,133 @@
+"""
+Compact author records.
+"""
+import sys
+from collections.abc import Mapping
+
+from .util import author_ordering, date_ordinal
+
+_missing = object()
+
+# shared tuples for instnames and thanks, since many authors have the same ones
+_tuples = {}
+
+def _intern_tuple(values):
+    t = tuple(sys.intern(v) for v in values)
+    return _tuples.setdefault(t, t)
+
+
+class AuthorRecord(Mapping):
+    """
+    A read-only author entry.
+
+    Behaves like the author dict it was made from, but stores the fields
+    in slots, interns the strings repeated between authors, and keeps
+    `instnames` and `thanks` as shared tuples.  Comparing to a dict
+    treats lists and tuples the same.
+
+    Records are never changed in place, so the sort key and date
+    ordinals are computed once per record.  Changing any field means making a new record.
+
+    Args:
+        data (dict): author data
+    """
+    FIELDS = ('authname', 'collab', 'email', 'first', 'from', 'instnames',
+              'keycloak_username', 'last', 'legacy', 'orcid', 'thanks', 'to')
+    INTERNED = ('collab', 'from', 'orcid', 'to')
+    TUPLES = ('instnames', 'thanks')
+    __slots__ = FIELDS + ('_extra', '_ordering', '_dates')
+
+    def __init__(self, data):
+        extra = None
+        for k,v in data.items():
+            if k not in self.FIELDS:
+                if extra is None:
+                    extra = {}
+                extra[k] = v
+                continue
+            if k in self.TUPLES and isinstance(v, (list, tuple)):
+                v = _intern_tuple(v)
+            elif k in self.INTERNED and isinstance(v, str):
+                v = sys.intern(v)
+            setattr(self, k, v)
+        self._extra = extra
+        self._ordering = None
+        self._dates = None
+
+    @classmethod
+    def create(cls, data):
+        """Get a record for `data`, which may already be a record."""
+        return data if isinstance(data, cls) else cls(data)
+
+    @property
+    def ordering(self):
+        """The `author_ordering` sort key, as a tuple."""
+        if self._ordering is None:
+            self._ordering = tuple(author_ordering(self))
+        return self._ordering
+
+    @property
+    def dates(self):
+        """The `from` and `to` dates, as `date_ordinal` integers."""
+        if self._dates is None:
+            self._dates = (date_ordinal(self['from']), date_ordinal(self.get('to')))
+        return self._dates
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for k in self.FIELDS:
+            if hasattr(self, k):
+                yield k
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping) and not isinstance(other, AuthorRecord):
+            other = AuthorRecord(other)
+        if not isinstance(other, AuthorRecord):
+            return NotImplemented
+        return (all(getattr(self, k, _missing) == getattr(other, k, _missing) for k in self.FIELDS)
+                and (self._extra or {}) == (other._extra or {}))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+    def __getstate__(self):
+        return (self.to_dict(), self._ordering)
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state, ordering = state
+        else:
+            ordering = None
+        self.__init__(state)
+        self._ordering = ordering
+
+    def to_dict(self):
+        """
+        Convert to a plain, json-serializable dict.
+
+        Returns: dict
+        """
+        ret = {}
+        for k,v in self.items():
+            if k in self.TUPLES and isinstance(v, tuple):
+                v = list(v)
+            ret[k] = v
+        return ret
+
+    copy = to_dict
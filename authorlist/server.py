@@ -7,6 +7,7 @@ from __future__ import print_function
 
 import os
 import json
+import logging
 from collections import defaultdict
 import itertools
 from datetime import datetime
@@ -15,11 +16,12 @@ import unidecode
 import tornado.web
 import tornado.ioloop
 
-from .state import State
+from .state import State, Store
 
 from . import collabs
+from . import compiled
 
-from .handlers import IceCubeHandler, PINGUHandler, Gen2Handler, APIAuthorHandler
+from .handlers import IceCubeHandler, PINGUHandler, Gen2Handler, APIAuthorHandler, APIRawAuthorHandler, RenderCache, prewarm_latex
 
 def get_template_path():
     return os.path.join(os.path.dirname(__file__),'templates')
@@ -27,30 +29,108 @@ def get_template_path():
 def get_static_path():
     return os.path.join(os.path.dirname(__file__),'static')
 
+# state view name: collab filter
+COLLAB_STATES = {
+    'icecube': 'icecube',
+    'icecube-pingu': 'pingu',
+    'icecube-gen2': 'icecube-gen2',
+}
+
+def load_states(json_filename):
+    """
+    Load the json file once, and index a state view for each collaboration.
+
+    Uses the compiled snapshot from :py:mod:`authorlist.compiled` if
+    there is a current one, and the json file otherwise.
+
+    Args:
+        json_filename (str): authorlist json file
+
+    Returns: dict of collab: State
+    """
+    states = compiled.load_states(json_filename, COLLAB_STATES)
+    if states is None:
+        store = Store(json_filename)
+        states = {name: State(collab=collab, store=store) for name,collab in COLLAB_STATES.items()}
+    for state in states.values():
+        prewarm_latex(state)
+    return states
+
 class WebServer:
-    def __init__(self, json, port=8888, debug=True):
+    """
+    The authorlist website.
+
+    Args:
+        json (str): authorlist json file
+        port (int): port to listen on (default: 8888)
+        debug (bool): tornado debug mode (default: True)
+        reload_interval (float): seconds between checks for a changed
+                                 json file, 0 to disable (default: 5)
+    """
+    def __init__(self, json, port=8888, debug=True, reload_interval=5):
         self.port = port
+        self.json = json
+        self.reload_interval = reload_interval
+
+        self._json_stat = self._stat()
+        self.states = load_states(json)
+        self.render_cache = RenderCache()
+        self._reloader = None
 
-        states = {
-            'icecube': State(json, collab='icecube'),
-            'icecube-pingu': State(json, collab='pingu'),
-            'icecube-gen2': State(json, collab='icecube-gen2'),
-        }
-        
+        kwargs = {'states': self.states, 'cache': self.render_cache}
         self.app = tornado.web.Application([
             (r'/', MainHandler, {'collabs': collabs}),
-            (r'/icecube', IceCubeHandler, {'state': states['icecube']}),
-            (r'/pingu', PINGUHandler, {'state': states['icecube-pingu']}),
-            (r'/icecube-gen2', Gen2Handler, {'state': states['icecube-gen2']}),
-            (r'/api/authors', APIAuthorHandler, {'states': states}),
+            (r'/icecube', IceCubeHandler, kwargs),
+            (r'/pingu', PINGUHandler, kwargs),
+            (r'/icecube-gen2', Gen2Handler, kwargs),
+            (r'/api/authors', APIAuthorHandler, kwargs),
+            (r'/api/authors/raw', APIRawAuthorHandler, kwargs),
         ], template_path=get_template_path(),
            template_whitespace='all' if debug else 'oneline',
            autoescape=None,
            static_path=get_static_path(),
            debug=debug)
 
+    def _stat(self):
+        st = os.stat(self.json)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    async def reload(self):
+        """
+        Reload the json file if it changed.
+
+        The new states are loaded and indexed off the IOLoop, then swapped
+        in all at once.  Requests in flight keep the state they started
+        with.  On errors, like a half-written file, the old states are
+        kept and the load is tried again next time.
+
+        Returns: bool, True if the states were reloaded
+        """
+        try:
+            json_stat = self._stat()
+        except OSError:
+            logging.warning('cannot stat %s', self.json, exc_info=True)
+            return False
+        if json_stat == self._json_stat:
+            return False
+
+        try:
+            states = await tornado.ioloop.IOLoop.current().run_in_executor(None, load_states, self.json)
+        except Exception:
+            logging.warning('failed to reload %s', self.json, exc_info=True)
+            return False
+
+        self.states.update(states)
+        self.render_cache.clear()
+        self._json_stat = json_stat
+        logging.info('reloaded %s', self.json)
+        return True
+
     def start(self):
         self.app.listen(self.port)
+        if self.reload_interval:
+            self._reloader = tornado.ioloop.PeriodicCallback(self.reload, self.reload_interval*1000)
+            self._reloader.start()
         tornado.ioloop.IOLoop.current().start()
 
 
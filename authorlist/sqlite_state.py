@@ -0,0 +1,469 @@
+"""
+Authorlist state, stored in SQLite.
+
+Same API as :py:class:`authorlist.state.State`, but queries go to a
+SQLite file instead of holding the whole history in memory.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from . import codec
+from .index import AttributeIndex, OPEN_DATE
+from .record import AuthorRecord
+from .state import State, dumps, INDEXED_INSTITUTION_ATTRS, _versions
+from .util import date_ordinal
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    id INTEGER PRIMARY KEY,
+    collab TEXT,
+    "from" TEXT NOT NULL,
+    "to" TEXT NOT NULL,
+    to_key TEXT NOT NULL,
+    keycloak_username TEXT NOT NULL,
+    authname TEXT NOT NULL,
+    legacy INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS authors_dates ON authors (collab, "from", to_key);
+CREATE INDEX IF NOT EXISTS authors_username ON authors (keycloak_username, collab);
+CREATE TABLE IF NOT EXISTS author_insts (
+    author_id INTEGER NOT NULL,
+    instname TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS author_insts_author ON author_insts (author_id);
+CREATE INDEX IF NOT EXISTS author_insts_inst ON author_insts (instname);
+CREATE TABLE IF NOT EXISTS institutions (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS thanks (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS acknowledgements (
+    id INTEGER PRIMARY KEY,
+    "from" TEXT NOT NULL,
+    "to" TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def _row_data(author):
+    return json.dumps(author.to_dict(), sort_keys=True)
+
+
+class SQLiteStore:
+    """
+    Authorlist data in a SQLite file.
+
+    Provides the parts of :py:class:`authorlist.state.Store` that
+    :py:class:`SQLiteState` needs.  Changes made by other processes are
+    picked up on the next query.
+
+    Args:
+        db_filename (str): name of the SQLite file
+    """
+    def __init__(self, db_filename):
+        self.db_filename = db_filename
+        self.conn = sqlite3.connect(db_filename, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self._transaction = None
+        self._data_version = None
+        self._cache = {}
+        self._version = next(_versions)
+
+    def _check(self):
+        """Drop cached data if another connection changed the database."""
+        if self._transaction is not None:
+            return
+        data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self.invalidate()
+
+    @property
+    def version(self):
+        self._check()
+        return self._version
+
+    def invalidate(self):
+        """Mark the data as changed, so views rebuild their indexes."""
+        self._version = next(_versions)
+        self._cache = {}
+
+    def _cached(self, name, query):
+        self._check()
+        if name not in self._cache:
+            self._cache[name] = query()
+        return self._cache[name]
+
+    def _meta(self, name, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    @property
+    def institutions(self):
+        return self._cached('institutions', lambda: {
+            name: json.loads(data) for name,data in self.conn.execute('SELECT name, data FROM institutions ORDER BY rowid')
+        })
+
+    def lookup_institutions(self, **attrs):
+        """
+        Get all institutions that match a set of attrs.
+
+        Args:
+            **attrs (dict): attrs to match on
+
+        Returns: dict of instname: values
+        """
+        institutions = self.institutions
+        index = self._cached('institutions_index', lambda: AttributeIndex(INDEXED_INSTITUTION_ATTRS, institutions))
+        return index.query(institutions, attrs)
+
+    @property
+    def thanks(self):
+        return self._cached('thanks', lambda: {
+            name: json.loads(data) for name,data in self.conn.execute('SELECT name, data FROM thanks ORDER BY rowid')
+        })
+
+    @property
+    def acknowledgements(self):
+        return self._cached('acknowledgements', lambda: [
+            {'from': f, 'to': t, 'value': v} for f,t,v in self.conn.execute('SELECT "from", "to", value FROM acknowledgements ORDER BY id')
+        ])
+
+    @property
+    def modified(self):
+        return self._cached('modified', lambda: datetime.fromisoformat(self._meta('modified', datetime.utcnow().isoformat())))
+
+    @property
+    def content_hash(self):
+        """
+        Hash of the data, stable across processes.
+
+        Each change is hashed onto the hash before it, so this does not
+        need to read all the data.
+        """
+        return self._cached('content_hash', lambda: self._meta('content_hash', ''))
+
+    @property
+    def sorted(self):
+        return True
+
+    def query(self, sql, args=()):
+        """
+        Get author records, in `author_ordering` order.
+
+        Args:
+            sql (str): WHERE clause for the authors table
+            args (tuple): query arguments
+
+        Returns: list of author records
+        """
+        self._check()
+        rows = self.conn.execute(f'SELECT data FROM authors WHERE {sql} ORDER BY id', args)
+        return sorted((AuthorRecord(json.loads(data)) for data, in rows), key=lambda a: a.ordering)
+
+    @property
+    def authors(self):
+        return self._cached('authors', lambda: self.query('1'))
+
+    def lookup(self, username, collab=None):
+        """
+        Get the author records for a username.
+
+        Args:
+            username (str): keycloak username
+            collab (str): (optional) only records in this collab
+
+        Returns: list of author records
+        """
+        if collab is None:
+            return self.query('keycloak_username = ?', (username,))
+        return self.query("keycloak_username = ? AND COALESCE(collab, '') = ?", (username, collab))
+
+    def _write(self, change):
+        """Record a change in the content hash and modified time."""
+        content_hash = hashlib.sha256((self._meta('content_hash', '')+change).encode('utf-8')).hexdigest()
+        self._set_meta('content_hash', content_hash)
+        self._set_meta('modified', datetime.utcnow().isoformat())
+
+    def _insert(self, author):
+        cur = self.conn.execute(
+            'INSERT INTO authors (collab, "from", "to", to_key, keycloak_username, authname, legacy, data) VALUES (?,?,?,?,?,?,?,?)',
+            (author.get('collab'), author['from'], author['to'], author['to'] or OPEN_DATE,
+             author.get('keycloak_username', ''), author['authname'], 1 if author.get('legacy', False) else 0,
+             _row_data(author)),
+        )
+        self.conn.executemany('INSERT INTO author_insts (author_id, instname) VALUES (?, ?)',
+                              [(cur.lastrowid, inst) for inst in author.get('instnames') or ()])
+        return cur.lastrowid
+
+    def _delete(self, author):
+        row = self.conn.execute('SELECT id FROM authors WHERE keycloak_username = ? AND data = ? LIMIT 1',
+                                (author.get('keycloak_username', ''), _row_data(author))).fetchone()
+        if not row:
+            raise ValueError('author not in store')
+        self.conn.execute('DELETE FROM authors WHERE id = ?', row)
+        self.conn.execute('DELETE FROM author_insts WHERE author_id = ?', row)
+
+    def replace(self, removed, added):
+        """
+        Remove and add author records.
+
+        Args:
+            removed (iterable): records currently in the store
+            added (iterable): new records
+        """
+        removed = list(removed)
+        added = list(added)
+        with self._writing():
+            for author in removed:
+                self._delete(author)
+            for author in added:
+                author_id = self._insert(author)
+                if self._transaction is not None:
+                    self._transaction['added'].append((author_id, author))
+            self._write(json.dumps({'remove': [a.to_dict() for a in removed], 'add': [a.to_dict() for a in added]}, sort_keys=True))
+
+    def add_institution(self, key, entry):
+        """
+        Add or replace an institution.
+
+        Args:
+            key (str): institution key
+            entry (dict): institution data
+        """
+        with self._writing():
+            data = json.dumps(entry, sort_keys=True)
+            if self.conn.execute('UPDATE institutions SET data = ? WHERE name = ?', (data, key)).rowcount == 0:
+                self.conn.execute('INSERT INTO institutions (name, data) VALUES (?, ?)', (key, data))
+            self._write(json.dumps({'institutions': {key: entry}}, sort_keys=True))
+
+    @contextmanager
+    def _writing(self):
+        """Run a change in its own transaction, unless one is open."""
+        if self._transaction is not None:
+            try:
+                yield
+            finally:
+                self.invalidate()
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        else:
+            self.conn.execute('COMMIT')
+        finally:
+            self.invalidate()
+
+    @property
+    def in_transaction(self):
+        return self._transaction is not None
+
+    def begin(self):
+        """Start a transaction."""
+        if self._transaction is not None:
+            raise RuntimeError('already in a transaction')
+        self.conn.execute('BEGIN IMMEDIATE')
+        self._transaction = {'added': []}
+
+    def rollback(self):
+        """Undo all changes made in the transaction."""
+        self._transaction = None
+        self.conn.execute('ROLLBACK')
+        self.invalidate()
+
+    def commit(self):
+        """
+        Check and apply all changes made in the transaction.
+
+        No added record may overlap in dates with another record of the
+        same person in the same collab.  On a conflict, the transaction
+        is rolled back.
+        """
+        for author_id, author in self._transaction['added']:
+            row = self.conn.execute(
+                "SELECT data FROM authors WHERE keycloak_username = ? AND COALESCE(collab, '') = ? AND id != ? AND \"from\" <= ? AND to_key >= ?",
+                (author.get('keycloak_username', ''), author.get('collab', ''), author_id, author['to'] or OPEN_DATE, author['from']),
+            ).fetchone()
+            if row:
+                logging.info(f'author: {row[0]}')
+                logging.info(f'author_data: {author}')
+                self.rollback()
+                raise Exception('date range overlap')
+        self._transaction = None
+        self.conn.execute('COMMIT')
+        self.invalidate()
+
+    def import_json(self, json_filename):
+        """
+        Replace all data with the contents of a json file.
+
+        Args:
+            json_filename (str): name of json file
+        """
+        with open(json_filename, 'rb') as f:
+            raw = f.read()
+        data = codec.loads(raw)
+        with self._writing():
+            for table in ('authors', 'author_insts', 'institutions', 'thanks', 'acknowledgements'):
+                self.conn.execute(f'DELETE FROM {table}')
+            for author in data['authors']:
+                self._insert(AuthorRecord(author))
+            self.conn.executemany('INSERT INTO institutions (name, data) VALUES (?, ?)',
+                                  [(k, json.dumps(v, sort_keys=True)) for k,v in data['institutions'].items()])
+            self.conn.executemany('INSERT INTO thanks (name, data) VALUES (?, ?)',
+                                  [(k, json.dumps(v, sort_keys=True)) for k,v in data['thanks'].items()])
+            self.conn.executemany('INSERT INTO acknowledgements ("from", "to", value) VALUES (?, ?, ?)',
+                                  [(a['from'], a['to'], a['value']) for a in data['acknowledgements']])
+            self._set_meta('content_hash', hashlib.sha256(raw).hexdigest())
+            self._set_meta('modified', datetime.utcnow().isoformat())
+
+    def dumps(self):
+        """
+        Write the data as canonical json.
+
+        Returns: bytes
+        """
+        return dumps(self.authors, self.institutions, self.thanks, self.acknowledgements)
+
+    def compact(self, json_filename=None):
+        """
+        Export the data to a json file, or vacuum the database.
+
+        Args:
+            json_filename (str): (optional) file to write
+        """
+        if json_filename is None:
+            self.conn.execute('VACUUM')
+            return
+        tmp = f'{json_filename}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.dumps())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, json_filename)
+
+
+class SQLiteState(State):
+    """
+    The authorlist state, stored in SQLite.
+
+    Args:
+        db_filename (str): name of the SQLite file
+        collab (str): (optional) name of collaboration to filter by
+        store (SQLiteStore): (optional) already open store, instead of a file name
+    """
+    def __init__(self, db_filename=None, collab=None, store=None):
+        if store is None:
+            store = SQLiteStore(db_filename)
+        super().__init__(collab=collab, store=store)
+
+    @classmethod
+    def from_json(cls, db_filename, json_filename, collab=None):
+        """
+        Create a SQLite state from a json file.
+
+        Args:
+            db_filename (str): name of the SQLite file
+            json_filename (str): name of json file holding state
+            collab (str): (optional) name of collaboration to filter by
+
+        Returns: :py:class:`SQLiteState`
+        """
+        store = SQLiteStore(db_filename)
+        store.import_json(json_filename)
+        return cls(collab=collab, store=store)
+
+    def _collab_sql(self):
+        if self._collab:
+            return '(collab IS NULL OR collab = ?)', (self._collab,)
+        return '1', ()
+
+    def _build_author_index(self):
+        # dates are indexed by the database
+        self._author_index = None
+
+    def _build_epoch_points(self):
+        sql, args = self._collab_sql()
+        points = {date_ordinal(p) for p, in self._store.conn.execute(
+            f'SELECT "from" FROM authors WHERE {sql} UNION SELECT "to" FROM authors WHERE {sql}', args+args)}
+        for date_from, date_to in self._ack_dates():
+            points.add(date_from)
+            points.add(date_to)
+        points.update(self._thanks_points())
+        self._epoch_points = sorted(points)
+        return self._epoch_points
+
+    def authors(self, date, legacy=False):
+        """
+        List all valid authors on a date.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+            legacy (bool): list legacy authors (default: False)
+
+        Returns: list of dicts
+        """
+        self._check_version()
+        sql, args = self._collab_sql()
+        sql += ' AND "from" <= ? AND to_key >= ?'
+        if not legacy:
+            sql += ' AND legacy = 0'
+        return self._store.query(sql, args+(date, date))
+
+    def authors_by_institution(self, date, legacy=False):
+        """
+        List the valid authors of each institution on a date.
+
+        Includes every instname of the authors, even institutions
+        outside this collab.  Queried through the `author_insts` table.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+            legacy (bool): list legacy authors (default: False)
+
+        Returns: dict of instname: list of authors
+        """
+        self._check_version()
+        sql, args = self._collab_sql()
+        sql += ' AND "from" <= ? AND to_key >= ?'
+        if not legacy:
+            sql += ' AND legacy = 0'
+        rows = self._store.conn.execute(
+            f'SELECT DISTINCT a.id, a.data FROM author_insts JOIN authors a ON a.id = author_insts.author_id WHERE {sql}',
+            args+(date, date))
+        authors = sorted((AuthorRecord(json.loads(data)) for _,data in rows), key=lambda a: a.ordering)
+        return {k: list(v) for k,v in self._index_institutions(authors).items()}
+
+    def strings(self):
+        """
+        Get all display text: author names, institution citations,
+        thanks and acknowledgements.
+
+        Returns: set of strings
+        """
+        sql, args = self._collab_sql()
+        ret = {name for name, in self._store.conn.execute(f'SELECT DISTINCT authname FROM authors WHERE {sql}', args)}
+        ret.update(inst['cite'] for inst in self._institutions.values() if 'cite' in inst)
+        ret.update(text for value in self._thanks.values() for _,_,text in self._thanks_entries(value))
+        ret.update(ack['value'] for ack in self._acknowledgements)
+        return ret
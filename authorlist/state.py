@@ -3,46 +3,690 @@ Authorlist state.
 
 Read from json file.
 """
-import json
-from collections import defaultdict
+import hashlib
 import itertools
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple, OrderedDict
 from datetime import datetime
 import logging
+from contextlib import contextmanager
+from types import MappingProxyType
 import unidecode
 
+from . import codec
 from . import collabs as COLLABORATIONS
-from .util import validate_author, author_ordering
+from .index import AttributeIndex, IntervalIndex
+from .record import AuthorRecord
+from .util import validate_author, author_ordering, date_ordinal, OPEN_ORDINAL
+
+#: institution attributes with an index for :py:meth:`State.lookup_institutions`
+INDEXED_INSTITUTION_ATTRS = ('name', 'city', 'cite', 'collabs', 'keycloak_groups')
+
+# unique across State objects, so caches never mix up two states
+_versions = itertools.count()
+
+Snapshot = namedtuple('Snapshot', ['authors', 'institutions', 'thanks', 'acknowledgements', 'authors_by_inst'])
+Snapshot.__doc__ = """
+The authorlist for one date epoch.
+
+Authors are sorted by `author_ordering`, and `authors_by_inst` maps
+each instname to its authors, in the same order.  Nothing in a snapshot
+changes until the state is modified.
+"""
+
+def dumps(authors, institutions, thanks, acknowledgements):
+    """
+    Write authorlist data as canonical json.
+
+    Args:
+        authors (list): author records, in `author_ordering` order
+        institutions (dict): institutions
+        thanks (dict): thanks
+        acknowledgements (list): acknowledgements
+
+    Returns: bytes
+    """
+    data = {
+        'acknowledgements': acknowledgements,
+        'authors': [a.to_dict() for a in authors],
+        'institutions': institutions,
+        'thanks': thanks,
+    }
+    return codec.dumps(data)
+
+
+class Store:
+    """
+    The parsed authorlist data, shared by :py:class:`State` views.
+
+    With a journal, every change is appended to `<json_filename>.journal`
+    and synced to disk before it is applied, instead of rewriting the
+    json file.  The journal is replayed on load, and :py:meth:`compact`
+    folds it back into the json file.
+
+    Args:
+        json_filename (str): name of json file holding state
+        journal (bool): keep a journal of changes (default: False)
+    """
+    def __init__(self, json_filename, journal=False):
+        with open(json_filename, 'rb') as f:
+            raw = f.read()
+        data = codec.loads(raw)
+        self.json_filename = os.fspath(json_filename)
+
+        # stored order is file order, until the first change sorts it
+        self.authors = [AuthorRecord(a) for a in data['authors']]
+        keys = [a.ordering for a in self.authors]
+        self._keys = keys if all(k <= k2 for k,k2 in zip(keys, keys[1:])) else None
+        self.institutions = data['institutions']
+        self.institutions_index = AttributeIndex(INDEXED_INSTITUTION_ATTRS, self.institutions)
+        self.thanks = data['thanks']
+        self.acknowledgements = data['acknowledgements']
+        self.version = next(_versions)
+        self.modified = datetime.utcfromtimestamp(os.path.getmtime(json_filename))
+        self._content_hash = hashlib.sha256(raw).hexdigest()
+
+        self.by_username = defaultdict(list)
+        self.by_username_collab = defaultdict(list)
+        for author in self.authors:
+            self._index(author)
+        self._transaction = None
+
+        self._file_hash = self._content_hash
+        self.journal = None
+        if journal:
+            self._replay(self.json_filename+'.journal')
+            self.journal = self.json_filename+'.journal'
+
+    def __getstate__(self):
+        if self._transaction is not None:
+            raise Exception('cannot save a store in a transaction')
+        state = self.__dict__.copy()
+        del state['_transaction']
+        state['journal'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._transaction = None
+        self.version = next(_versions)
+
+    def _index(self, author):
+        username = author.get('keycloak_username', '')
+        self.by_username[username].append(author)
+        self.by_username_collab[(username, author.get('collab', ''))].append(author)
+
+    def _unindex(self, author):
+        username = author.get('keycloak_username', '')
+        for index, key in ((self.by_username, username),
+                           (self.by_username_collab, (username, author.get('collab', '')))):
+            records = index[key]
+            for i,a in enumerate(records):
+                if a is author:
+                    del records[i]
+                    break
+            if not records:
+                del index[key]
+
+    def lookup(self, username, collab=None):
+        """
+        Get the author records for a username.
+
+        Args:
+            username (str): keycloak username
+            collab (str): (optional) only records in this collab
+
+        Returns: list of author records
+        """
+        if collab is None:
+            return list(self.by_username.get(username, ()))
+        return list(self.by_username_collab.get((username, collab), ()))
+
+    def replace(self, removed, added):
+        """
+        Remove and add author records, keeping the indexes up to date.
+
+        Records are found and inserted by bisecting the sorted keys.
+        In a transaction, only the indexes are updated, and the author
+        list is changed at commit.
+
+        Args:
+            removed (iterable): records currently in the store
+            added (iterable): new records
+        """
+        if self._transaction is not None:
+            added_ids = self._transaction['added']
+            for author in removed:
+                self._unindex(author)
+                if id(author) in added_ids:
+                    del added_ids[id(author)]
+                else:
+                    self._transaction['removed'][id(author)] = author
+            for author in added:
+                self._index(author)
+                if id(author) in self._transaction['removed']:
+                    # put back unchanged
+                    del self._transaction['removed'][id(author)]
+                else:
+                    added_ids[id(author)] = author
+            return
+        removed = list(removed)
+        added = list(added)
+        self._log(removed, added)
+        if self._keys is None:
+            self._sort()
+        for author in removed:
+            key = author.ordering
+            i = bisect_left(self._keys, key)
+            while i < len(self.authors) and self.authors[i] is not author:
+                i += 1
+            if i == len(self.authors):
+                raise ValueError('author not in store')
+            del self.authors[i]
+            del self._keys[i]
+            self._unindex(author)
+        for author in added:
+            key = author.ordering
+            i = bisect_right(self._keys, key)
+            self.authors.insert(i, author)
+            self._keys.insert(i, key)
+            self._index(author)
+        self.invalidate()
+
+    def _sort(self):
+        """Sort the authors by `author_ordering`, keeping the keys alongside."""
+        keys = [a.ordering for a in self.authors]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.authors[:] = [self.authors[i] for i in order]
+        self._keys = [keys[i] for i in order]
+
+    @property
+    def in_transaction(self):
+        return self._transaction is not None
+
+    def begin(self):
+        """Start a transaction, saving what is needed to roll back."""
+        if self._transaction is not None:
+            raise RuntimeError('already in a transaction')
+        self._transaction = {
+            'added': {},
+            'removed': {},
+            'new_institutions': {},
+            'by_username': {k: list(v) for k,v in self.by_username.items()},
+            'by_username_collab': {k: list(v) for k,v in self.by_username_collab.items()},
+            'institutions': dict(self.institutions),
+        }
+
+    def rollback(self):
+        """Undo all changes made in the transaction."""
+        txn = self._transaction
+        self._transaction = None
+        self.by_username = defaultdict(list, txn['by_username'])
+        self.by_username_collab = defaultdict(list, txn['by_username_collab'])
+        if self.institutions != txn['institutions']:
+            self.institutions.clear()
+            self.institutions.update(txn['institutions'])
+            self.institutions_index = AttributeIndex(INDEXED_INSTITUTION_ATTRS, self.institutions)
+            self.invalidate()
+
+    def commit(self):
+        """
+        Check and apply all changes made in the transaction.
+
+        No added record may overlap in dates with another record of the
+        same person in the same collab.  On a conflict, the transaction
+        is rolled back.
+        """
+        txn = self._transaction
+        added = list(txn['added'].values())
+        for author in added:
+            key = (author.get('keycloak_username', ''), author.get('collab', ''))
+            date_from, date_to = author.dates
+            for other in self.by_username_collab[key]:
+                if other is not author and other.dates[0] <= date_to and other.dates[1] >= date_from:
+                    logging.info(f'author: {other}')
+                    logging.info(f'author_data: {author}')
+                    self.rollback()
+                    raise Exception('date range overlap')
+
+        try:
+            self._log(txn['removed'].values(), added, txn['new_institutions'])
+        except BaseException:
+            self.rollback()
+            raise
+        self._transaction = None
+        if not (added or txn['removed']):
+            return
+        authors = [a for a in self.authors if id(a) not in txn['removed']]
+        authors.extend(sorted(added, key=lambda a: a.ordering))
+        self.authors[:] = authors
+        self._sort()
+        self.invalidate()
+
+    def add_institution(self, key, entry):
+        """
+        Add or replace an institution.
+
+        Args:
+            key (str): institution key
+            entry (dict): institution data
+        """
+        if self._transaction is not None:
+            self._transaction['new_institutions'][key] = entry
+        else:
+            self._log((), (), {key: entry})
+        self.institutions[key] = entry
+        self.institutions_index.add(key, entry)
+        self.invalidate()
+
+    def lookup_institutions(self, **attrs):
+        """
+        Get all institutions that match a set of attrs.
+
+        Args:
+            **attrs (dict): attrs to match on
+
+        Returns: dict of instname: values
+        """
+        return self.institutions_index.query(self.institutions, attrs)
+
+    def _log(self, removed, added, institutions=None):
+        """Append one change to the journal, and sync it to disk."""
+        if not self.journal:
+            return
+        entry = {
+            'remove': [a.to_dict() for a in removed],
+            'add': [a.to_dict() for a in added],
+            'institutions': institutions or {},
+        }
+        if not (entry['remove'] or entry['add'] or entry['institutions']):
+            return
+        lines = []
+        if not os.path.exists(self.journal):
+            lines.append(json.dumps({'base': self._file_hash}))
+        lines.append(json.dumps(entry, sort_keys=True))
+        with open(self.journal, 'a') as f:
+            f.write(''.join(line+'\n' for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay(self, journal):
+        """
+        Apply the changes in a journal.
+
+        A journal for a different json file, like one left over from an
+        interrupted compaction, is moved aside to `<journal>.stale`, so
+        new changes start a fresh journal.  A last line that was not
+        completely written is cut off, so new changes are not appended
+        to it.
+        """
+        if not os.path.exists(journal):
+            return
+        with open(journal, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+        if lines and not lines[-1].endswith(b'\n'):
+            logging.warning('removing incomplete last entry of journal %s', journal)
+            lines.pop()
+            with open(journal, 'r+b') as f:
+                f.truncate(sum(len(line) for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+        if not lines:
+            os.remove(journal)
+            return
+        if json.loads(lines[0]).get('base') != self._file_hash:
+            logging.warning('moving aside journal %s, it is for a different json file', journal)
+            os.replace(journal, journal+'.stale')
+            return
+        for i,line in enumerate(lines[1:], 2):
+            entry = json.loads(line)
+            removed = []
+            for data in entry['remove']:
+                data = AuthorRecord(data)
+                for author in self.by_username.get(data.get('keycloak_username', ''), ()):
+                    if author == data and not any(author is r for r in removed):
+                        removed.append(author)
+                        break
+                else:
+                    raise Exception(f'journal {journal} line {i}: could not find author')
+            self.replace(removed, [AuthorRecord(a) for a in entry['add']])
+            for key, inst in entry['institutions'].items():
+                self.add_institution(key, inst)
+
+    def compact(self, json_filename=None):
+        """
+        Write the data to a json file, and clear the journal.
+
+        The file is replaced atomically, so a crash leaves either
+        the old or the new file.
+
+        Args:
+            json_filename (str): (optional) file to write, instead of the loaded json file
+        """
+        if json_filename is None:
+            json_filename = self.json_filename
+        json_filename = os.fspath(json_filename)
+        raw = self.dumps()
+        tmp = json_filename+'.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, json_filename)
+        if os.path.abspath(json_filename) == os.path.abspath(self.json_filename):
+            self._file_hash = hashlib.sha256(raw).hexdigest()
+            if self.journal and os.path.exists(self.journal):
+                os.remove(self.journal)
+
+    @property
+    def sorted(self):
+        """True if the authors are in `author_ordering` order."""
+        return self._keys is not None
+
+    def invalidate(self):
+        """Mark the data as changed, so views rebuild their indexes."""
+        self.version = next(_versions)
+        self.modified = datetime.utcnow()
+        self._content_hash = None
+
+    @property
+    def content_hash(self):
+        """
+        Hash of the state content, stable across processes.
+
+        This is the hash of the json file until the data is modified,
+        and after that the hash of the canonical json from :py:meth:`dumps`.
+        """
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.dumps()).hexdigest()
+        return self._content_hash
+
+    def dumps(self):
+        """
+        Write the data as canonical json.
+
+        Returns: bytes
+        """
+        authors = self.authors if self.sorted else sorted(self.authors, key=author_ordering)
+        return dumps(authors, self.institutions, self.thanks, self.acknowledgements)
+
 
 class State:
     """
     The authorlist state.
 
+    A state is a view of a :py:class:`Store`, filtered by collab.
+    Views of the same store share the data, so changes made through
+    one view are seen by all of them.
+
     Args:
         json_filename (str): name of json file holding state
         collab (str): (optional) name of collaboration to filter by
+        store (Store): (optional) already loaded store, instead of a json file
+        journal (bool): keep a journal of changes, see :py:class:`Store` (default: False)
     """
-    def __init__(self, json_filename, collab=None):
-        with open(json_filename) as f:
-            data = json.load(f)
+    #: most recently used epoch snapshots to keep
+    MAX_SNAPSHOTS = 256
+
+    def __init__(self, json_filename=None, collab=None, store=None, journal=False):
+        if store is None:
+            store = Store(json_filename, journal=journal)
 
         if collab:
             assert collab in COLLABORATIONS
         self._collab = collab
-        self._authors = data['authors']
-        self._institutions = data['institutions']
-        self._thanks = data['thanks']
-        self._acknowledgements = data['acknowledgements']
+        self._store = store
+        self._indexed_version = None
+        self._check_version()
+
+    @property
+    def _authors(self):
+        return self._store.authors
+
+    @property
+    def _institutions(self):
+        return self._store.institutions
+
+    @property
+    def _thanks(self):
+        return self._store.thanks
+
+    @property
+    def _acknowledgements(self):
+        return self._store.acknowledgements
+
+    @property
+    def version(self):
+        """Version of the data, which changes on every modification."""
+        return self._store.version
+
+    @property
+    def modified(self):
+        """Time the data was last modified."""
+        return self._store.modified
+
+    @property
+    def content_hash(self):
+        """Hash of the data, stable across processes."""
+        return self._store.content_hash
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group changes, so they are checked and sorted once, and applied
+        all together or not at all.
+
+        Date overlaps are checked at commit instead of by each change, so
+        changes to one person can be made in any order.  Queries inside
+        the transaction see the author list from before it.  Nested
+        transactions join the outer one.
+
+        Example::
+
+            with state.transaction():
+                state.update_authors([old_author])
+                state.add_author(new_author)
+        """
+        store = self._store
+        if store.in_transaction:
+            yield self
+            return
+        store.begin()
+        try:
+            yield self
+        except BaseException:
+            store.rollback()
+            raise
+        store.commit()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_indexed_version'] = self._indexed_version == self._store.version
+        state['_snapshots'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # indexes built before saving are still current
+        self._indexed_version = self._store.version if state['_indexed_version'] else None
+
+    def _check_version(self):
+        """
+        Rebuild derived indexes if the store changed since they were built.
+
+        Mutations leave this to the next query, so a run of changes
+        only rebuilds once.
+        """
+        if self._indexed_version != self._store.version:
+            self._snapshots = OrderedDict()
+            self._build_author_index()
+            self._build_thanks_index()
+            self._build_ack_index()
+            self._build_epoch_points()
+            self._indexed_version = self._store.version
+
+    def _build_author_index(self):
+        """
+        Index the authors in this collab by date range.
+
+        Values are positions in `self._authors`, so queries can
+        return authors in stored order.
+        """
+        intervals = []
+        for i,author in enumerate(self._authors):
+            if self._collab and 'collab' in author and author['collab'] != self._collab:
+                continue
+            intervals.append((*author.dates, i))
+        self._author_index = IntervalIndex(intervals)
+        return self._author_index
+
+    @staticmethod
+    def _thanks_entries(value):
+        """
+        Get the dated texts of a thanks.
+
+        A thanks is either text valid at all dates, or a list of
+        entries like acknowledgements, with `from`, `to` and `value`.
+
+        Returns: list of (from, to, text), with `date_ordinal` dates
+        """
+        if isinstance(value, str):
+            return [(0, OPEN_ORDINAL, value)]
+        return [(date_ordinal(v['from']) if v.get('from') else 0, date_ordinal(v.get('to')), v['value'])
+                for v in value]
+
+    def _build_thanks_index(self):
+        """Index the thanks texts by date range."""
+        intervals = []
+        for name, value in self._thanks.items():
+            for date_from, date_to, text in self._thanks_entries(value):
+                intervals.append((date_from, date_to, (len(intervals), name, text)))
+        self._thanks_index = IntervalIndex(intervals)
+        return self._thanks_index
+
+    def _build_ack_index(self):
+        """
+        Index the acknowledgements by date range.
+
+        Values are positions in `self._acknowledgements`, so queries
+        can return them in stored order.
+        """
+        self._ack_index = IntervalIndex(
+            (date_from, date_to, i)
+            for i,(date_from, date_to) in enumerate(self._ack_dates())
+        )
+        return self._ack_index
+
+    def _ack_dates(self):
+        """
+        Get the date range of each acknowledgement.
+
+        An empty `from` is valid since the beginning, like for thanks.
+
+        Returns: list of (from, to), with `date_ordinal` dates
+        """
+        return [(date_ordinal(ack['from']) if ack.get('from') else 0, date_ordinal(ack['to']))
+                for ack in self._acknowledgements]
+
+    def _thanks_points(self):
+        """Dates where a thanks text changes."""
+        for value in self._thanks.values():
+            if not isinstance(value, str):
+                for date_from, date_to, _ in self._thanks_entries(value):
+                    yield date_from
+                    yield date_to
+
+    def _build_epoch_points(self):
+        """
+        Find the dates where the authorlist for this collab can change.
+
+        Every `from` and `to` date of an author, acknowledgement or
+        dated thanks is a change-point.  A query date either equals a change-point or falls
+        strictly between two of them, which gives `2*len(points)+1` epochs.
+        Points are `date_ordinal` integers.
+        """
+        points = set()
+        for author in self._authors:
+            if self._collab and 'collab' in author and author['collab'] != self._collab:
+                continue
+            points.update(author.dates)
+        for date_from, date_to in self._ack_dates():
+            points.add(date_from)
+            points.add(date_to)
+        points.update(self._thanks_points())
+        self._epoch_points = sorted(points)
+        return self._epoch_points
+
+    def epoch(self, date):
+        """
+        Get the epoch a date falls in.
+
+        All dates in the same epoch have the same authorlist.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+
+        Returns: int
+        """
+        self._check_version()
+        points = self._epoch_points
+        date = date_ordinal(date)
+        i = bisect_left(points, date)
+        if i < len(points) and points[i] == date:
+            return 2*i+1
+        return 2*i
+
+    def snapshot(self, date, legacy=False):
+        """
+        Get the authorlist snapshot for the epoch of a date.
+
+        Snapshots are materialized on first use and shared by every
+        date in the epoch.  Only the `MAX_SNAPSHOTS` most recently used
+        are kept.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+            legacy (bool): list legacy authors (default: False)
+
+        Returns: :py:class:`Snapshot`
+        """
+        key = (self.epoch(date), bool(legacy))
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            self._snapshots.move_to_end(key)
+        else:
+            authors = self.authors(date, legacy=legacy)
+            if not self._store.sorted:
+                authors.sort(key=author_ordering)
+            authors_by_inst = self._index_institutions(authors)
+            snapshot = Snapshot(
+                authors=tuple(authors),
+                institutions=MappingProxyType(self._scan_institutions(authors_by_inst)),
+                thanks=MappingProxyType(self._scan_thanks(authors, date)),
+                acknowledgements=tuple(self._scan_acknowledgements(date)),
+                authors_by_inst=MappingProxyType(authors_by_inst),
+            )
+            self._snapshots[key] = snapshot
+            if len(self._snapshots) > self.MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return snapshot
 
     def save(self, json_filename):
-        data = {
-            'acknowledgements': self._acknowledgements,
-            'authors': sorted(self._authors, key=author_ordering),
-            'institutions': self._institutions,
-            'thanks': self._thanks,
-        }
+        """
+        Save the state to a json file.
+
+        Saving over the loaded json file also clears the journal.
+
+        Args:
+            json_filename (str): name of json file to write
+        """
+        self._store.compact(json_filename)
 
-        with open(json_filename, 'w') as f:
-            json.dump(data, f, indent=2, sort_keys=True)
+    def compact(self):
+        """Fold the journal back into the loaded json file."""
+        self._store.compact()
 
     def authors(self, date, legacy=False):
         """
@@ -54,13 +698,10 @@ class State:
 
         Returns: list of dicts
         """
-        ret = []
-        for author in self._authors:
-            if self._collab and 'collab' in author and author['collab'] != self._collab:
-                continue
-            if author['from'] <= date and (author['to'] >= date or not author['to']):
-                if legacy or not author.get('legacy', False):
-                    ret.append(author)
+        self._check_version()
+        ret = [self._authors[i] for i in sorted(self._author_index.query(date_ordinal(date)))]
+        if not legacy:
+            ret = [a for a in ret if not a.get('legacy', False)]
         return ret
 
     def remove_author(self, author_data):
@@ -70,9 +711,10 @@ class State:
         Args:
             author_data (dict): removed author information
         """
-        for author in self._authors:
+        author_data = AuthorRecord.create(author_data)
+        for author in self._store.lookup(author_data.get('keycloak_username', '')):
             if author == author_data:
-                self._authors.remove(author)
+                self._store.replace([author], [])
                 return
         raise Exception('could not find author')
 
@@ -85,23 +727,23 @@ class State:
             author_data (dict): new author information
         """
         logging.debug(f'{author_data}')
+        author_data = AuthorRecord.create(author_data)
 
         username = author_data['keycloak_username']
         collab = author_data['collab']
-        date_from = author_data['from']
+        date_from = author_data.dates[0]
 
-        new_authors = [author_data]
-        for author in self._authors:
-            if username == author.get('keycloak_username', '') and collab == author.get('collab', ''):
-                # found an author in the right collab
-                # check date range
-                if (not author['to']) or author['to'] >= date_from:
-                    logging.info(f'author: {author}')
-                    logging.info(f'author_data: {author_data}')
-                    raise Exception('date range overlap')
-            new_authors.append(author)
+        # in a transaction, overlaps are checked at commit
+        authors = [] if self._store.in_transaction else self._store.lookup(username, collab)
+        for author in authors:
+            # found an author in the right collab
+            # check date range
+            if author.dates[1] >= date_from:
+                logging.info(f'author: {author}')
+                logging.info(f'author_data: {author_data}')
+                raise Exception('date range overlap')
 
-        self._authors = sorted(new_authors, key=author_ordering)
+        self._store.replace([], [author_data])
 
     def update_authors(self, author_data, collabs=None):
         """
@@ -127,6 +769,7 @@ class State:
         # make sure data is valid
         for a in author_data:
             validate_author(a)
+        author_data = [AuthorRecord.create(a) for a in author_data]
 
         username_set = {a['keycloak_username'] for a in author_data}
         if len(username_set) > 1:
@@ -135,14 +778,10 @@ class State:
         if not username:
             raise RuntimeError('keycloak_username must be set')
 
+        current_author_data = [author for author in self._store.lookup(username)
+                               if (not collabs) or author.get('collab', '') in collabs]
+        removed = list(current_author_data)
         new_authors = []
-        current_author_data = []
-        for author in self._authors:
-            if username == author.get('keycloak_username', ''):
-                if (not collabs) or author.get('collab', '') in collabs:
-                    current_author_data.append(author)
-                    continue
-            new_authors.append(author)
 
         if not current_author_data:
             logging.info(f'adding new authors: {[a["keycloak_username"] for a in author_data]}')
@@ -168,7 +807,24 @@ class State:
             logging.info(f'current_author_data: {current_author_data}')
             raise Exception('unknown update type')
 
-        self._authors = sorted(new_authors, key=author_ordering)
+        self._store.replace(removed, new_authors)
+
+    def strings(self):
+        """
+        Get all display text: author names, institution citations,
+        thanks and acknowledgements.
+
+        Returns: set of strings
+        """
+        ret = set()
+        for author in self._authors:
+            if self._collab and 'collab' in author and author['collab'] != self._collab:
+                continue
+            ret.add(author['authname'])
+        ret.update(inst['cite'] for inst in self._institutions.values() if 'cite' in inst)
+        ret.update(text for value in self._thanks.values() for _,_,text in self._thanks_entries(value))
+        ret.update(ack['value'] for ack in self._acknowledgements)
+        return ret
 
     def institutions(self, date, **kwargs):
         """
@@ -179,14 +835,41 @@ class State:
 
         Returns: dict of dicts
         """
+        return dict(self.snapshot(date, **kwargs).institutions)
+
+    def authors_by_institution(self, date, **kwargs):
+        """
+        List the valid authors of each institution on a date.
+
+        Includes every instname of the authors, even institutions
+        outside this collab.
+
+        Args:
+            date (str): a date in ISO 8601 string format
+            legacy (bool): list legacy authors (default: False)
+
+        Returns: dict of instname: list of authors
+        """
+        return {k: list(v) for k,v in self.snapshot(date, **kwargs).authors_by_inst.items()}
+
+    @staticmethod
+    def _index_institutions(authors):
+        by_inst = {}
+        for a in authors:
+            for inst in a.get('instnames') or ():
+                if inst in by_inst:
+                    by_inst[inst].append(a)
+                else:
+                    by_inst[inst] = [a]
+        return {k: tuple(v) for k,v in by_inst.items()}
+
+    def _scan_institutions(self, authors_by_inst):
         insts = {}
-        for a in itertools.chain(self.authors(date, **kwargs)):
-            if 'instnames' in a and a['instnames']:
-                for inst in a['instnames']:
-                    inst_data = self._institutions[inst]
-                    if self._collab and 'collabs' in inst_data and self._collab not in inst_data['collabs']:
-                        continue
-                    insts[inst] = inst_data
+        for inst in authors_by_inst:
+            inst_data = self._institutions[inst]
+            if self._collab and 'collabs' in inst_data and self._collab not in inst_data['collabs']:
+                continue
+            insts[inst] = inst_data
         return insts
 
     def add_institution(self, name, collabs, **attrs):
@@ -222,9 +905,23 @@ class State:
             'collabs': collabs,
             'name': name,
         })
-        self._institutions[key] = entry
+        self._store.add_institution(key, entry)
         return key
 
+    def update_institution(self, name, **attrs):
+        """
+        Change some fields of an institution.
+
+        Args:
+            name (str): institution key
+            **attrs (dict): fields to set
+
+        Returns: dict of new institution data
+        """
+        entry = dict(self._institutions[name], **attrs)
+        self._store.add_institution(name, entry)
+        return entry
+
     def lookup_institutions(self, **attrs):
         """
         Get all institutions that match a set of attrs.
@@ -234,29 +931,34 @@ class State:
 
         Returns: dict of instname: values
         """
-        attr_items = attrs.items()
-        ret = {}
-        for key, values in self._institutions.items():
-            if attr_items <= values.items():
-                ret[key] = values
-        return ret
+        return self._store.lookup_institutions(**attrs)
 
     def thanks(self, date, **kwargs):
         """
         List all valid thanks on a date.
 
+        Only thanks of authors valid on the date are listed, with the
+        thanks text valid on the date.
+
         Args:
             date (str): a date in ISO 8601 string format
 
         Returns: dict
         """
+        return dict(self.snapshot(date, **kwargs).thanks)
+
+    def _scan_thanks(self, authors, date):
+        # the last entry in the data wins, if dates overlap
+        texts = {name: text for _,name,text in sorted(self._thanks_index.query(date_ordinal(date)))}
         thanks = {}
-        for a in itertools.chain(self.authors(date, **kwargs)):
+        for a in authors:
             if 'thanks' in a and a['thanks']:
                 for t in a['thanks']:
-                    thanks[t] = self._thanks[t]
+                    if t in texts:
+                        thanks[t] = texts[t]
+                    elif t not in self._thanks:
+                        raise KeyError(t)
         return thanks
-        ## TODO: actually support dates for thanks
 
     def acknowledgements(self, date):
         """
@@ -267,10 +969,11 @@ class State:
 
         Returns: list of strings
         """
-        ret = []
-        for ack in self._acknowledgements:
-            if ack['from'] <= date and (ack['to'] >= date or not ack['to']):
-                ret.append(ack['value'])
+        return list(self.snapshot(date).acknowledgements)
+
+    def _scan_acknowledgements(self, date):
+        acks = self._acknowledgements
+        ret = [acks[i]['value'] for i in sorted(self._ack_index.query(date_ordinal(date)))]
         if ret and ret[-1][-1] == ';':
             ret[-1] = ret[-1][:-1]+'.'
         return ret
@@ -88,6 +88,7 @@ async function AuthorList(id, baseurl = 'https://authorlist.icecube.wisc.edu', f
     console.log('getting authors for filters:')
     console.log(filters)
     const response = await axios.get(baseurl+'/api/authors', {
+      headers: {'Accept': 'application/vnd.authorlist.'+(filters.formatting || 'web')+'+json'},
       params: filters,
       paramsSerializer: URLSerializer
     });
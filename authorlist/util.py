@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import date, datetime
+import functools
 import unidecode
 
 
@@ -14,6 +15,30 @@ def validate_date(d):
         return None
     return d
 
+#: ordinal of an open-ended date, the same day as `index.OPEN_DATE`
+OPEN_ORDINAL = 2*date.max.toordinal()
+
+@functools.lru_cache(maxsize=65536)
+def date_ordinal(d):
+    """
+    Convert an ISO 8601 date to an integer, for fast comparisons.
+
+    A date is twice its day ordinal.  A timestamp is one more than its
+    date, so it falls between its day and the next, just like the ISO
+    strings compare.  An empty date is open-ended.
+
+    Args:
+        d (str): a date or timestamp in ISO 8601 string format
+
+    Returns: int
+    """
+    if not d:
+        return OPEN_ORDINAL
+    ret = 2*date.fromisoformat(d[:10]).toordinal()
+    if len(d) > 10:
+        ret += 1
+    return ret
+
 def validate_author(a):
     assert 'authname' in a
     assert 'collab' in a
@@ -22,24 +47,18 @@ def validate_author(a):
     assert 'from' in a
     assert validate_date(a['from'])
     assert 'instnames' in a
-    assert isinstance(a['instnames'], list)
+    assert isinstance(a['instnames'], (list, tuple))
     assert 'keycloak_username' in a
     assert 'last' in a
     assert 'orcid' in a
     assert 'thanks' in a
-    assert isinstance(a['thanks'], list)
+    assert isinstance(a['thanks'], (list, tuple))
     assert 'to' in a
     if a['to']:
         assert validate_date(a['to'])
 
-def author_ordering(a):
-    """
-    The 'key' function in sorting authors.
-    
-    Sort authors using English unicode sorting rules.
-    Secondary sorting by 'to', then 'collab', then 'from', then 'instnames'.
-    """
-    name = a['authname']
+@functools.lru_cache(maxsize=16384)
+def _name_ordering(name):
     parts = unidecode.unidecode(name).replace("'",'').split()
     ret = []
     for i,p in enumerate(reversed(parts)):
@@ -50,5 +69,16 @@ def author_ordering(a):
             break
         else:
             ret[0] = p + ret[0]
+    return tuple(x.lower() for x in ret)
+
+def author_ordering(a):
+    """
+    The 'key' function in sorting authors.
+    
+    Sort authors using English unicode sorting rules.
+    Secondary sorting by 'to', then 'collab', then 'from', then 'instnames'.
+
+    The name part is cached, since it is the slow part.
+    """
     extras = [a['to'], a['collab'], a['from'], a['instnames']] if a['to'] else ['3000', a['collab'], a['from'], a['instnames']]
-    return [x.lower() for x in ret]+extras
+    return list(_name_ordering(a['authname']))+extras
@@ -3,7 +3,6 @@ Edit the authorlist json file.
 """
 from __future__ import print_function
 
-import json
 import random
 import webbrowser
 from pprint import pprint
@@ -13,7 +12,7 @@ import tornado.ioloop
 import tornado.web
 from tornado.escape import json_encode, json_decode
 
-from authorlist import collabs
+from authorlist import codec, collabs
 from authorlist.util import author_ordering
 
 
@@ -38,8 +37,7 @@ def save(outfile, data):
     data['authors'].sort(key=author_ordering)
 
     if outfile:
-        with open(outfile, 'w') as f:
-            json.dump(data, f, indent=2, sort_keys=True)
+        codec.dump(data, outfile)
     else:
         pprint(data)
 
@@ -60,6 +58,8 @@ class MainHandler(tornado.web.RequestHandler):
 
         collaborations = {c:collabs[c] for c in collaborations}
         institutions = {inst:self.data['institutions'][inst]['cite'] for inst in institutions}
+        # dated thanks show their latest text
+        thanks = {k:(v if isinstance(v, str) else v[-1]['value']) for k,v in self.data['thanks'].items()}
 
         self.write("""<!DOCTYPE html>
 <html lang="en">
@@ -123,6 +123,7 @@ class MainHandler(tornado.web.RequestHandler):
         var data = """+json_encode(self.data)+""";
         var collaborations = """+json_encode(collaborations)+"""
         var institutions = """+json_encode(institutions)+"""
+        var thanks_text = """+json_encode(thanks)+"""
 
         function text_format(id, text, value=''){
             return '<div class="text"><span class="label">'+text+':</span><input autocomplete="off" class="'+id+'" type="text" value="'+value+'"></div>';
@@ -183,7 +184,7 @@ class MainHandler(tornado.web.RequestHandler):
             html += checkbox_format('legacy', 'Legacy Author');
             html += select_format('collaboration', 'Collaboration', collaborations);
             html += select_format('institution', 'Institution', institutions);
-            html += select_format('thanks', 'Thanks', data['thanks']);
+            html += select_format('thanks', 'Thanks', thanks_text);
             html += '<button id="update">Update</button>';
             html += '</section>';
             $('article').html(html);
@@ -395,8 +396,7 @@ def main():
 
     args = parser.parse_args()
 
-    with open(args.input) as f:
-        data = json.load(f)
+    data = codec.load(args.input)
     data['authors'].sort(key=author_ordering)
 
     app = make_app(args.output, data)
@@ -164,8 +164,8 @@ async def export(state, experiment, dryrun=False, client=None):
             if au['orcid'] != attrs.get('orcid', ''):
                 attrs['orcid'] = au['orcid']
                 update = True
-            if au['thanks'] != attrs.get(f'authorlist_{experiment.lower()}_thanks', []):
-                attrs[f'authorlist_{experiment.lower()}_thanks'] = au['thanks']
+            if list(au['thanks']) != attrs.get(f'authorlist_{experiment.lower()}_thanks', []):
+                attrs[f'authorlist_{experiment.lower()}_thanks'] = list(au['thanks'])
                 update = True
             if update:
                 logging.warning(f'  updating attribs for {ku["username"]}')
@@ -219,6 +219,7 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
             for k in ret:
                 if match != k:
                     all_author_insts[k]['keycloak_groups'].remove(krs_path)
+                    state.update_institution(k, keycloak_groups=all_author_insts[k]['keycloak_groups'])
                     removed_insts.add(k)
         else:
             new_inst = create_inst(krs_insts_raw, krs_path, experiment=experiment)
@@ -228,6 +229,7 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
                 logging.debug('%r != %r', old_inst, new_inst)
                 removed_insts.add(ret[-1])
                 old_inst['keycloak_groups'].remove(krs_path)
+                state.update_institution(ret[-1], keycloak_groups=old_inst['keycloak_groups'])
                 r = state.lookup_institutions(**new_inst)
                 if r:
                     assert len(r) == 1
@@ -250,6 +252,7 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
     logging.info('now timestamp %s', now)
     authors = state.authors(now)
     author_insts = state.institutions(now)
+    authors_by_inst = state.authors_by_institution(now)
     for i in author_insts:
         if i not in authorlist_insts_to_groups and i not in removed_insts:
             logging.debug('mapping: %r', authorlist_insts_to_groups)
@@ -270,7 +273,7 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
     updated_author_data = defaultdict(dict)
     for authorlist_inst, keycloak_group in authorlist_insts_to_groups.items():
         logging.warning(f'processing {authorlist_inst} {keycloak_group}')
-        authorlist_users = [a for a in authors if authorlist_inst in a['instnames']]
+        authorlist_users = authors_by_inst.get(authorlist_inst, [])
 
         keycloak_users = await get_keycloak_users(keycloak_group, rest_client=client)
 
@@ -314,7 +317,7 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
                     thanks = user['attributes'].get(f'authorlist_{experiment.lower()}_thanks', [])
                     if isinstance(thanks, str):
                         thanks = [thanks]
-                    if au['thanks'] != thanks:
+                    if list(au['thanks']) != thanks:
                         logging.warning(f'   keycloak thanks update: {user["username"]}  {au["thanks"]} -> {thanks}')
                         a['thanks'] = thanks
                         attr_update = True
@@ -348,41 +351,43 @@ async def sync(state, filename_out, experiment, dryrun=False, client=None):
                         'to': '',
                     }
 
-    # remove/update existing authors
-    for username in sorted(authors_by_username):
-        a = authors_by_username[username]
-        if username not in new_author_insts:
-            logging.info(f'removing {username}')
-            remove_author = a.copy()
-            remove_author['to'] = (now_date-timedelta(days=1)).isoformat()
-            if remove_author['to'] < remove_author['from']:
-                logging.info(f'    completely overwrite prev update to {username}')
-                state.remove_author(a)
-            else:
-                state.update_authors([remove_author])
-        elif new_author_insts[username] == set(a['instnames']) and username not in updated_author_data:
-            continue  # no updates
-        else:
-            logging.info(f'updating {username}')
-            update_author = updated_author_data[username] if username in updated_author_data else a.copy()
-            update_author['instnames'] = sorted(new_author_insts[username])
-            update_author['from'] = now_date.isoformat()
-            remove_author = a.copy()
-            remove_author['to'] = (now_date-timedelta(days=1)).isoformat()
-            if remove_author['to'] < remove_author['from']:
-                logging.info(f'    completely overwrite prev update to {username}')
-                state.remove_author(a)
+    # apply all author changes at once
+    with state.transaction():
+        # remove/update existing authors
+        for username in sorted(authors_by_username):
+            a = authors_by_username[username]
+            if username not in new_author_insts:
+                logging.info(f'removing {username}')
+                remove_author = a.copy()
+                remove_author['to'] = (now_date-timedelta(days=1)).isoformat()
+                if remove_author['to'] < remove_author['from']:
+                    logging.info(f'    completely overwrite prev update to {username}')
+                    state.remove_author(a)
+                else:
+                    state.update_authors([remove_author])
+            elif new_author_insts[username] == set(a['instnames']) and username not in updated_author_data:
+                continue  # no updates
             else:
-                state.update_authors([remove_author])
-            state.add_author(update_author)
+                logging.info(f'updating {username}')
+                update_author = updated_author_data[username] if username in updated_author_data else a.copy()
+                update_author['instnames'] = sorted(new_author_insts[username])
+                update_author['from'] = now_date.isoformat()
+                remove_author = a.copy()
+                remove_author['to'] = (now_date-timedelta(days=1)).isoformat()
+                if remove_author['to'] < remove_author['from']:
+                    logging.info(f'    completely overwrite prev update to {username}')
+                    state.remove_author(a)
+                else:
+                    state.update_authors([remove_author])
+                state.add_author(update_author)
 
-    # add new authors
-    for username in sorted(new_author_insts):
-        if username not in authors_by_username:
-            a = updated_author_data[username]
-            a['instnames'] = sorted(new_author_insts[username])
-            logging.info(f'adding author {a["keycloak_username"]} with insts {a["instnames"]}')
-            state.add_author(a)
+        # add new authors
+        for username in sorted(new_author_insts):
+            if username not in authors_by_username:
+                a = updated_author_data[username]
+                a['instnames'] = sorted(new_author_insts[username])
+                logging.info(f'adding author {a["keycloak_username"]} with insts {a["instnames"]}')
+                state.add_author(a)
 
     if not dryrun:
         state.save(filename_out)
@@ -396,6 +401,7 @@ def main():
     parser.add_argument('--experiment', action='append', help='experiment to filter by')
     parser.add_argument('--log-level', default='info', choices=('debug', 'info', 'warning', 'error'), help='logging level')
     parser.add_argument('--dryrun', action='store_true', help='dry run')
+    parser.add_argument('--journal', action='store_true', help='journal changes to disk as they are made')
     args = vars(parser.parse_args())
 
     logging.basicConfig(level=getattr(logging, args['log_level'].upper()))
@@ -408,7 +414,7 @@ def main():
     State(args['filename']).save(args['filename_out'])
     for exp in args['experiment']:
         logging.warning('Syncing for experiment %s', exp)
-        state = State(args['filename_out'], collab=exp.lower())
+        state = State(args['filename_out'], collab=exp.lower(), journal=args['journal'] and not args['dryrun'])
         asyncio.run(sync(state, args['filename_out'], experiment=exp, dryrun=args['dryrun'], client=keycloak_client))
 
 if __name__ == '__main__':
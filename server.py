@@ -15,6 +15,7 @@ CONFIG = {
     'JSON': os.environ.get('JSON', None),
     'LOGFILE': os.environ.get('LOGFILE', '-'),
     'LOGLEVEL': os.environ.get('LOGLEVEL', 'info'),
+    'RELOAD': os.environ.get('RELOAD', '5'),
 }
 
 def runner(args):
@@ -27,7 +28,7 @@ def runner(args):
         log_args['filename'] = args.logfile
     logging.basicConfig(**log_args)
 
-    w = WebServer(port=args.port, json=args.json)
+    w = WebServer(port=args.port, json=args.json, reload_interval=args.reload)
     logging.info('server running on port %s', args.port)
     w.start()
 
@@ -37,6 +38,7 @@ def main():
     parser.add_argument('action',nargs='?',help='(start,stop) daemon server')
     parser.add_argument('-j','--json',default=CONFIG['JSON'],help='authorlist json file')
     parser.add_argument('-p','--port',type=int,default=int(CONFIG['PORT']),help='port to listen on')
+    parser.add_argument('--reload',type=float,default=float(CONFIG['RELOAD']),help='seconds between checks for a changed json file, 0 to disable')
     parser.add_argument('-n','--no-daemon',dest='daemon',default=True,action='store_false',help='do not daemonize')
     parser.add_argument('--logfile',default=CONFIG['LOGFILE'],help='filename for logging')
     parser.add_argument('-l','--loglevel',default=CONFIG['LOGLEVEL'],help='log level')
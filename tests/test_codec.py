@@ -0,0 +1,34 @@
+import json
+
+from authorlist import codec
+
+from test_state import AUTHOR_DATA
+
+
+DATA = {
+    'text': 'x\x01\x1f\x7f\n\t\b\f\r"\\/é\U0001f600  ',
+    'empty': [],
+    'nested': {'b': [1, True, None, {}], 'a': 'Universität'},
+    'authors': AUTHOR_DATA['authors'],
+}
+
+
+def test_dumps():
+    expected = json.dumps(DATA, indent=2, sort_keys=True).encode('ascii')
+    assert codec.dumps(DATA) == expected
+    assert codec.dumps(DATA, accelerated=False) == expected
+    assert codec.dumps({'a': 'plain'}) == json.dumps({'a': 'plain'}, indent=2).encode('ascii')
+
+
+def test_loads():
+    raw = json.dumps(DATA).encode('utf-8')
+    assert codec.loads(raw) == DATA
+    assert codec.loads(raw, accelerated=False) == DATA
+
+
+def test_dump_load(tmp_path):
+    filename = str(tmp_path / 'data.json')
+    codec.dump(DATA, filename)
+    with open(filename) as f:
+        assert json.load(f) == DATA
+    assert codec.load(filename) == DATA
@@ -0,0 +1,72 @@
+import json
+import os
+
+from authorlist import compiled
+from authorlist.state import State
+
+from test_state import AUTHOR_DATA
+
+
+COLLABS = {'icecube': 'icecube', 'icecube-gen2': 'icecube-gen2'}
+
+
+def test_compile(tmp_path):
+    filename = str(tmp_path / 'output.json')
+    with open(filename, 'w') as f:
+        json.dump(AUTHOR_DATA, f)
+
+    states = compiled.compile_states(filename, COLLABS)
+    assert os.path.exists(filename+'.state')
+
+    states2 = compiled.load_states(filename, COLLABS)
+    assert set(states2) == set(COLLABS)
+    assert states2['icecube']._store is states2['icecube-gen2']._store
+    for name in COLLABS:
+        s, s2 = states[name], states2[name]
+        assert s2._indexed_version == s2.version
+        assert s2.content_hash == s.content_hash
+        for date in ('2019-01-01', '2020-06-01', '2021-01-01'):
+            assert s2.authors(date) == s.authors(date)
+            assert s2.epoch(date) == s.epoch(date)
+        assert s2._authors[0]._ordering == s._authors[0].ordering
+
+    # compiled states can still be changed
+    s2 = states2['icecube']
+    author = dict(s2._authors[0])
+    author['authname'] = 'J. Smith'
+    s2.update_authors([author])
+    assert s2.authors('2021-01-01')[0]['authname'] == 'J. Smith'
+
+    # different collab views
+    assert compiled.load_states(filename, {'icecube': 'icecube'}) is None
+
+
+def test_layout(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'output.json')
+    with open(filename, 'w') as f:
+        json.dump(AUTHOR_DATA, f)
+    compiled.compile_states(filename, COLLABS)
+    assert compiled.load_states(filename, COLLABS) is not None
+
+    # compiled by different code
+    monkeypatch.setattr(compiled, 'layout_hash', lambda: 'other')
+    assert compiled.load_states(filename, COLLABS) is None
+
+
+def test_stale(tmp_path):
+    filename = str(tmp_path / 'output.json')
+    assert compiled.load_states(filename, COLLABS) is None
+
+    with open(filename, 'w') as f:
+        json.dump(AUTHOR_DATA, f)
+    compiled.compile_states(filename, COLLABS)
+
+    data = json.loads(json.dumps(AUTHOR_DATA))
+    data['authors'][0]['authname'] = 'J. Smith'
+    with open(filename, 'w') as f:
+        json.dump(data, f)
+    assert compiled.load_states(filename, COLLABS) is None
+
+    with open(filename+'.state', 'wb') as f:
+        f.write(b'garbage')
+    assert compiled.load_states(filename, COLLABS) is None
@@ -0,0 +1,373 @@
+import email.utils
+import json
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from authorlist.server import WebServer
+from authorlist.state import State
+from authorlist import handlers, output
+from authorlist.handlers import AuthorListRenderer, RenderCache, Latex, latex, latex_acks, utf8tolatex, prewarm_latex
+
+from test_state import AUTHOR_DATA, DATED_THANKS
+
+
+def test_render_cache(json_file):
+    filename = json_file(AUTHOR_DATA)
+    s = State(filename, collab='icecube')
+    cache = RenderCache(maxsize=2)
+
+    r = AuthorListRenderer(s, cache=cache)
+    ret = r.render('IceCube', '2021-01-01', 'revtex4')
+    assert cache.misses == 1 and cache.hits == 0
+    assert 'Author List for Rev{\\TeX} 20210101}' in ret['format_text']
+    assert ret['date'] == '2021-01-01'
+
+    # same epoch, different date
+    ret2 = AuthorListRenderer(s, cache=cache).render('IceCube', '2022-03-04', 'revtex4')
+    assert cache.misses == 1 and cache.hits == 1
+    assert 'Author List for Rev{\\TeX} 20220304}' in ret2['format_text']
+    assert ret2['date'] == '2022-03-04'
+    assert ret2['format_text'].replace('20220304', '20210101') == ret['format_text']
+
+    # different epoch
+    AuthorListRenderer(s, cache=cache).render('IceCube', '2019-01-01', 'revtex4')
+    assert cache.misses == 2
+
+    # bounded
+    AuthorListRenderer(s, cache=cache).render('IceCube', '2021-01-01', 'inspire')
+    assert len(cache) == 2
+
+    # state changes invalidate
+    author = s._authors[0].copy()
+    author['to'] = '2021-06-01'
+    s.update_authors([author])
+    ret3 = AuthorListRenderer(s, cache=cache).render('IceCube', '2022-03-04', 'revtex4')
+    assert cache.misses == 4
+    assert 'J. Doe' not in ret3['format_text']
+
+
+def test_render_cache_clear():
+    cache = RenderCache()
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_latex_encode():
+    latex = Latex(maxsize=2)
+    assert latex.encode('J. Doe') == 'J. Doe'
+    assert latex.cache_info().misses == 0
+
+    assert latex.encode('Argüelles') == 'Arg{\\"u}elles'
+    assert latex.encode('Argüelles') == 'Arg{\\"u}elles'
+    assert latex.encode('A & B') == 'A {\\&} B'
+    assert latex.encode('Nguyễn') == 'Nguy{\\~{\\^{{e}}}}n'
+    info = latex.cache_info()
+    assert info.hits == 1
+    assert info.currsize == 2
+
+
+def test_prewarm_latex(json_file):
+    data = dict(AUTHOR_DATA, thanks={'thanks1': 'also at Universität'})
+    filename = json_file(data)
+    s = State(filename)
+
+    prewarm_latex(s)
+    misses = latex.cache_info().misses
+    assert utf8tolatex('Universität') == 'Universit{\\"a}t'
+    assert latex.cache_info().misses == misses
+
+
+def test_render_thanks_dates(json_file):
+    data = dict(AUTHOR_DATA, thanks=DATED_THANKS)
+    s = State(json_file(data))
+    r = AuthorListRenderer(s)
+
+    ret = r.render('IceCube', '2021-01-01', 'revtex4')
+    assert 'Old thanks' in ret['format_text']
+    ret = r.render('IceCube', '2021-06-30T12:00:00', 'web')
+    assert ret['thanks'] == {}
+    assert '<sup>1</sup>' in ret['authors']
+    ret = r.render('IceCube', '2022-01-01', 'revtex4')
+    assert 'New thanks' in ret['format_text']
+    assert 'Old thanks' not in ret['format_text']
+
+
+def test_render_other_collab_inst(json_file):
+    data = json.loads(json.dumps(AUTHOR_DATA))
+    data['authors'][0]['collab'] = 'pingu'
+    data['authors'][0]['instnames'] = ['inst1', 'inst2']
+    data['institutions']['inst1']['collabs'] = ['icecube', 'pingu']
+    data['institutions']['inst2'] = {'cite': 'Inst2', 'city': 'City2', 'collabs': ['icecube'], 'name': 'Inst2'}
+    s = State(json_file(data), collab='pingu')
+    r = AuthorListRenderer(s)
+
+    ret = r.render('IceCube-PINGU', '2021-01-01', 'web')
+    assert 'J. Doe<sup>1,a</sup>' in ret['authors']
+    ret = r.render('IceCube-PINGU', '2021-01-01', 'web-institution')
+    assert ret['sorted_insts'] == ['inst1']
+    ret = r.render('IceCube-PINGU', '2021-01-01', 'json')
+    assert json.loads(ret['format_text'])['authors'][0]['instnames'] == ['inst1', 'inst2']
+    ret = r.render('IceCube-PINGU', '2021-01-01', 'inspire')
+    assert 'Inst2' not in ret['format_text']
+
+
+def test_latex_acks(json_file):
+    data = dict(AUTHOR_DATA, acknowledgements=[
+        {'from': '2020-01-01', 'to': '', 'value': 'Universität;'},
+        {'from': '2020-01-01', 'to': '', 'value': 'Foundation;'},
+    ])
+    s = State(json_file(data))
+    acks = s.snapshot('2021-01-01').acknowledgements
+    assert latex_acks(acks) == 'Universit{\\"a}t;\nFoundation.'
+
+    hits = latex_acks.cache_info().hits
+    for f in ('revtex4', 'aastex', 'elsevier'):
+        ret = AuthorListRenderer(s).render('IceCube', '2021-01-01', f)
+        assert latex_acks(acks) in ret['format_text']
+    assert latex_acks.cache_info().hits > hits
+
+
+def test_output_stream():
+    fragments = ['a'*3, 'b'*5, 'c', 'd'*10, 'e']
+    chunks = list(output.stream(iter(fragments), chunk_size=8))
+    assert chunks == ['aaabbbbb', 'c'+'d'*10, 'e']
+    assert ''.join(chunks) == output.build(fragments)
+    assert list(output.stream([])) == []
+
+
+@pytest_asyncio.fixture
+async def web_server(json_file):
+    filename = json_file(AUTHOR_DATA)
+    server = WebServer(str(filename), debug=False)
+    sock, port = bind_unused_port()
+    http_server = HTTPServer(server.app)
+    http_server.add_sockets([sock])
+    yield server, f'http://127.0.0.1:{port}'
+    http_server.stop()
+
+
+@pytest.mark.asyncio
+async def test_stream_collab(web_server):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01&formatting=inspire')
+    body = ret.body.decode('utf-8')
+    assert '<pre id="data" class="format_text">&lt;?xml' in body
+    assert '&lt;cal:creationDate&gt;2021-01-01&lt;/cal:creationDate&gt;' in body
+    assert 'J. Doe' in body
+    assert body.rstrip().endswith('</html>')
+
+    # served from cache the second time
+    hits = server.render_cache.hits
+    ret2 = await client.fetch(f'{address}/icecube?date=2021-01-01&formatting=inspire')
+    assert server.render_cache.hits == hits + 1
+    assert ret2.body == ret.body
+
+    # other formats are not streamed
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01')
+    assert 'J. Doe<sup>1,a</sup>' in ret.body.decode('utf-8')
+
+
+@pytest.mark.asyncio
+async def test_raw_download(web_server):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    ret = await client.fetch(f'{address}/api/authors/raw?date=2021-01-01&formatting=inspire')
+    assert ret.headers['Content-Type'] == 'application/xml; charset=UTF-8'
+    assert 'IceCube-20210101-inspire.xml' in ret.headers['Content-Disposition']
+    body = ret.body.decode('utf-8')
+    assert body.startswith('<?xml')
+    assert '<cal:creationDate>2021-01-01</cal:creationDate>' in body
+
+    ret = await client.fetch(f'{address}/api/authors/raw?date=2021-01-01&formatting=json')
+    data = json.loads(ret.body)
+    assert data['sorted_insts'] == ['inst1']
+
+    with pytest.raises(HTTPClientError) as exc:
+        await client.fetch(f'{address}/api/authors/raw?formatting=web')
+    assert exc.value.code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_error(web_server, monkeypatch):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    def failing(after):
+        def _inspire(self):
+            def text():
+                yield 'x'*after
+                raise RuntimeError('formatter failed')
+            return {'format_text': text(), 'intro_text': ''}
+        return _inspire
+
+    # fails before anything is written: an error response
+    monkeypatch.setattr(AuthorListRenderer, '_inspire', failing(0))
+    for url in ('/icecube?date=2021-01-01&formatting=inspire',
+                '/api/authors/raw?date=2021-01-01&formatting=inspire'):
+        with pytest.raises(HTTPClientError) as exc:
+            await client.fetch(address+url)
+        assert exc.value.code == 500
+
+    # fails partway through: the connection is cut, not finished
+    monkeypatch.setattr(AuthorListRenderer, '_inspire', failing(3*output.CHUNK_SIZE))
+    for url in ('/icecube?date=2021-01-02&formatting=inspire',
+                '/api/authors/raw?date=2021-01-02&formatting=inspire'):
+        with pytest.raises(Exception) as exc:
+            await client.fetch(address+url)
+        assert getattr(exc.value, 'code', 599) != 200
+    assert len(server.render_cache) == 0
+
+
+def test_render_shared_model(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'data.json')
+    with open(filename, 'w') as f:
+        json.dump(AUTHOR_DATA, f)
+    s = State(filename)
+
+    calls = []
+    snapshot = s.snapshot
+    def counting_snapshot(*args, **kwargs):
+        calls.append(args)
+        return snapshot(*args, **kwargs)
+    monkeypatch.setattr(s, 'snapshot', counting_snapshot)
+
+    r = AuthorListRenderer(s)
+    for f in ('web', 'arxiv', 'revtex4', 'json'):
+        r.render('IceCube', '2021-01-01', f)
+    assert len(calls) == 1
+
+    r.render('IceCube', '2021-01-01', 'web', legacy=True)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_api_accept(web_server):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01')
+    assert 'web' in json.loads(ret.body)
+    assert len(json.loads(ret.body)) > 2
+
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01',
+                             headers={'Accept': 'application/vnd.authorlist.web+json'})
+    assert list(json.loads(ret.body)) == ['web']
+    assert ret.headers['Vary'] == 'Accept'
+
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01', headers={
+        'Accept': 'application/vnd.authorlist.web+json, application/vnd.authorlist.arxiv+json;q=0',
+    })
+    assert list(json.loads(ret.body)) == ['web']
+
+    # unknown formats are skipped
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01', headers={
+        'Accept': 'application/vnd.authorlist.web+json, application/vnd.authorlist.pdf+json',
+    })
+    assert list(json.loads(ret.body)) == ['web']
+
+    # only a q of zero refuses a format
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01', headers={
+        'Accept': 'application/vnd.authorlist.web+json;q=0.5, application/vnd.authorlist.arxiv+json; q=0.0',
+    })
+    assert list(json.loads(ret.body)) == ['web']
+
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01&formatting=arxiv',
+                             headers={'Accept': 'application/vnd.authorlist.web+json'})
+    assert list(json.loads(ret.body)) == ['arxiv']
+
+
+@pytest.mark.asyncio
+async def test_conditional_get(web_server):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    for url in ('/icecube?date=2021-01-01', '/icecube?date=2021-01-01&formatting=inspire',
+                '/api/authors?date=2021-01-01', '/api/authors/raw?date=2021-01-01'):
+        ret = await client.fetch(address+url)
+        etag = ret.headers['Etag']
+        assert etag.startswith('"')
+        assert 'Last-Modified' in ret.headers
+
+        misses, hits = server.render_cache.misses, server.render_cache.hits
+        ret = await client.fetch(address+url, headers={'If-None-Match': etag}, raise_error=False)
+        assert ret.code == 304
+        assert (server.render_cache.misses, server.render_cache.hits) == (misses, hits)
+
+        ret = await client.fetch(address+url, headers={'If-Modified-Since': ret.headers['Last-Modified']}, raise_error=False)
+        assert ret.code == 304
+
+        ret = await client.fetch(address+url, headers={'If-None-Match': '"other"'})
+        assert ret.code == 200
+
+    # the date is part of the page
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01')
+    ret2 = await client.fetch(f'{address}/icecube?date=2021-01-02')
+    assert ret.headers['Etag'] != ret2.headers['Etag']
+
+    # a list for today is newer than yesterday's, even with old data
+    server.states['icecube']._store.modified = datetime(2020, 1, 1)
+    yesterday = email.utils.format_datetime(datetime.combine(datetime.utcnow().date()-timedelta(days=1), time(12), tzinfo=timezone.utc), usegmt=True)
+    ret = await client.fetch(f'{address}/icecube', headers={'If-Modified-Since': yesterday})
+    assert ret.code == 200
+    assert email.utils.parsedate_to_datetime(ret.headers['Last-Modified']).date() == datetime.utcnow().date()
+    ret = await client.fetch(f'{address}/icecube', headers={'If-Modified-Since': ret.headers['Last-Modified']}, raise_error=False)
+    assert ret.code == 304
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01', headers={'If-Modified-Since': yesterday}, raise_error=False)
+    assert ret.code == 304
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_new_code(web_server, monkeypatch):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01')
+    etag = ret.headers['Etag']
+
+    # new rendering code makes old pages stale
+    monkeypatch.setattr(handlers, 'render_version', lambda: 'new')
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01', headers={'If-None-Match': etag})
+    assert ret.code == 200
+    assert ret.headers['Etag'] != etag
+
+
+@pytest.mark.asyncio
+async def test_reload(web_server):
+    server, address = web_server
+    client = AsyncHTTPClient()
+
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01')
+    assert 'J. Doe' in ret.body.decode('utf-8')
+    assert len(server.render_cache) > 0
+    assert not await server.reload()
+
+    # a half-written file keeps the old state
+    old_state = server.states['icecube']
+    with open(server.json, 'w') as f:
+        f.write('{"authors": [')
+    assert not await server.reload()
+    assert server.states['icecube'] is old_state
+
+    data = json.loads(json.dumps(AUTHOR_DATA))
+    data['authors'][0]['authname'] = 'J. Smith'
+    with open(server.json, 'w') as f:
+        json.dump(data, f)
+    assert await server.reload()
+    assert server.states['icecube'] is not old_state
+    assert len(server.render_cache) == 0
+
+    ret = await client.fetch(f'{address}/icecube?date=2021-01-01')
+    assert 'J. Smith' in ret.body.decode('utf-8')
+    ret = await client.fetch(f'{address}/api/authors?date=2021-01-01&formatting=arxiv')
+    assert 'J. Smith' in json.loads(ret.body)['arxiv']['format_text']
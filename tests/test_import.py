@@ -892,7 +892,7 @@ async def test_sync_update_cite(json_file, keycloak_fake, monkeypatch):
 
     for author in s._authors:
         if author['keycloak_username'] == 'jdoe2' and author['to'] == '':
-            assert author['instnames'] != ['inst2-astro']
+            assert list(author['instnames']) != ['inst2-astro']
             break
     else:
         logging.debug('%r', s._authors)
@@ -0,0 +1,33 @@
+from authorlist.index import IntervalIndex, AttributeIndex
+
+
+def test_interval_query():
+    idx = IntervalIndex([(2, 6, 'a'), (4, 10, 'b'), (8, 8, 'c')])
+    assert sorted(idx.query(1)) == []
+    assert sorted(idx.query(2)) == ['a']
+    assert sorted(idx.query(5)) == ['a', 'b']
+    assert sorted(idx.query(8)) == ['b', 'c']
+    assert sorted(idx.query(11)) == []
+
+def test_interval_reversed():
+    idx = IntervalIndex([(2, 6, 'a'), (10, 4, 'bad'), (20, 12, 'bad2')])
+    for date in range(22):
+        assert 'bad' not in idx.query(date)
+        assert 'bad2' not in idx.query(date)
+    assert idx.query(3) == ['a']
+
+def test_interval_empty():
+    assert IntervalIndex([]).query(5) == []
+    assert IntervalIndex([(6, 2, 'bad')]).query(4) == []
+
+
+def test_attribute_query():
+    entries = {
+        'x': {'cite': 'X', 'city': 'Madison'},
+        'y': {'cite': 'Y', 'city': 'Madison'},
+        'z': {'cite': 'Z', 'city': 'Berlin'},
+    }
+    idx = AttributeIndex(['city'], entries)
+    assert list(idx.query(entries, {'city': 'Madison'})) == ['x', 'y']
+    assert list(idx.query(entries, {'city': 'Madison', 'cite': 'Y'})) == ['y']
+    assert idx.query(entries, {'city': 'Paris'}) == {}
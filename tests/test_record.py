@@ -0,0 +1,67 @@
+import json
+import pickle
+import pytest
+
+from authorlist.record import AuthorRecord
+from authorlist.util import author_ordering, date_ordinal, OPEN_ORDINAL
+
+from test_state import AUTHOR_DATA
+
+
+def test_record():
+    data = AUTHOR_DATA['authors'][0]
+    a = AuthorRecord(data)
+    assert a == data
+    assert data == a
+    assert a['instnames'] == ('inst1',)
+    assert a.get('legacy', False) is False
+    assert 'legacy' not in a
+    assert list(a) == sorted(data)
+    assert len(a) == len(data)
+    with pytest.raises(KeyError):
+        a['legacy']
+    with pytest.raises(TypeError):
+        a['to'] = '2021-01-01'
+
+    d = a.copy()
+    assert isinstance(d, dict)
+    assert json.loads(json.dumps(d)) == data
+    d['to'] = '2021-01-01'
+    assert a != d
+    assert a == AuthorRecord.create(a)
+    assert pickle.loads(pickle.dumps(a)) == a
+
+
+def test_record_shared():
+    data = AUTHOR_DATA['authors'][0]
+    a = AuthorRecord(json.loads(json.dumps(data)))
+    b = AuthorRecord(json.loads(json.dumps(data)))
+    assert a['instnames'] is b['instnames']
+    assert a['collab'] is b['collab']
+
+
+def test_record_extra():
+    data = dict(AUTHOR_DATA['authors'][0], note='x')
+    a = AuthorRecord(data)
+    assert a['note'] == 'x'
+    assert a.to_dict() == data
+    assert a != AUTHOR_DATA['authors'][0]
+
+
+def test_record_ordering():
+    data = AUTHOR_DATA['authors'][0]
+    a = AuthorRecord(data)
+    assert a.ordering == tuple(author_ordering(a))
+    assert list(a.ordering[:-1]) == author_ordering(data)[:-1]
+    assert a.ordering is a.ordering
+
+
+def test_dates():
+    assert date_ordinal('2020-01-01') < date_ordinal('2020-01-01T00:00:00') < date_ordinal('2020-01-02')
+    assert date_ordinal('') == OPEN_ORDINAL
+    assert date_ordinal('9999-12-31') == OPEN_ORDINAL
+
+    r = AuthorRecord(AUTHOR_DATA['authors'][0])
+    assert r.dates == (date_ordinal('2020-01-01'), OPEN_ORDINAL)
+    r = AuthorRecord(dict(AUTHOR_DATA['authors'][0], to='2021-06-30'))
+    assert r.dates == (date_ordinal('2020-01-01'), date_ordinal('2021-06-30'))
@@ -0,0 +1,101 @@
+import json
+import pytest
+
+from authorlist.state import State
+from authorlist.sqlite_state import SQLiteState
+from authorlist.handlers import AuthorListRenderer
+
+from test_state import AUTHOR_DATA, DATED_THANKS
+
+
+@pytest.fixture
+def states(json_file, tmp_path):
+    filename = json_file(AUTHOR_DATA)
+    db = str(tmp_path / 'authors.db')
+    return State(filename), SQLiteState.from_json(db, filename), db
+
+
+def test_import_export(states, tmp_path):
+    s, sq, db = states
+    sq.save(str(tmp_path / 'out.json'))
+    with open(tmp_path / 'out.json') as f:
+        assert json.load(f) == AUTHOR_DATA
+    assert sq.content_hash == s.content_hash
+    assert sq.strings() == s.strings()
+
+
+def test_queries(states):
+    s, sq, db = states
+    for date in ('2019-01-01', '2020-01-01', '2020-06-01T12:00:00', '2025-01-01'):
+        assert sq.authors(date) == s.authors(date)
+        assert sq.institutions(date) == s.institutions(date)
+        assert sq.thanks(date) == s.thanks(date)
+        assert sq.acknowledgements(date) == s.acknowledgements(date)
+        assert sq.epoch(date) == s.epoch(date)
+        assert sq.authors_by_institution(date) == s.authors_by_institution(date)
+
+    r = AuthorListRenderer(s)
+    r2 = AuthorListRenderer(sq)
+    for f in ('web', 'arxiv', 'revtex4', 'json'):
+        assert r2.render('IceCube', '2021-01-01', f) == r.render('IceCube', '2021-01-01', f)
+
+
+def test_thanks_dates(json_file, tmp_path):
+    data = dict(AUTHOR_DATA, thanks=DATED_THANKS)
+    filename = json_file(data)
+    s = State(filename)
+    sq = SQLiteState.from_json(str(tmp_path / 'authors.db'), filename)
+    assert sq._thanks == DATED_THANKS
+    for date in ('2020-01-01', '2021-06-30T12:00:00', '2022-01-01'):
+        assert sq.thanks(date) == s.thanks(date)
+        assert sq.epoch(date) == s.epoch(date)
+
+
+def test_open_acks(json_file, tmp_path):
+    data = dict(AUTHOR_DATA, acknowledgements=[
+        {'from': '', 'to': '2020-06-30', 'value': 'Open;'},
+        {'from': '2020-01-01', 'to': '', 'value': 'First;'},
+    ])
+    filename = json_file(data)
+    s = State(filename)
+    sq = SQLiteState.from_json(str(tmp_path / 'authors.db'), filename)
+    assert sq.acknowledgements('1990-01-01') == ['Open.']
+    for date in ('1990-01-01', '2020-06-30', '2020-07-01'):
+        assert sq.acknowledgements(date) == s.acknowledgements(date)
+        assert sq.epoch(date) == s.epoch(date)
+
+
+def test_mutations(states):
+    s, sq, db = states
+    version = sq.version
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    new_author = dict(author, instnames=['inst2'], to='')
+    new_author['from'] = '2021-01-02'
+
+    for state in (s, sq):
+        state.update_authors([author])
+        state.add_author(new_author)
+        with pytest.raises(Exception, match='overlap'):
+            state.add_author(new_author)
+        with pytest.raises(Exception, match='overlap'):
+            with state.transaction():
+                state.remove_author(author)
+                state.add_author(dict(new_author, instnames=['inst1']))
+        inst = state.add_institution('Inst3', collabs=['icecube'], cite='Inst3 cite')
+        state.update_institution(inst, city='Somewhere')
+
+    assert sq.version != version
+    assert sq._authors == s._authors
+    assert sq._institutions == s._institutions
+    assert sq.authors_by_institution('2020-06-01') == s.authors_by_institution('2020-06-01')
+    assert sq.authors_by_institution('2022-01-01') == {'inst2': [new_author]}
+    assert sq.lookup_institutions(city='Somewhere') == s.lookup_institutions(city='Somewhere')
+    assert list(sq.lookup_institutions(cite='Inst3 cite', collabs=['icecube'])) == [inst]
+    assert sq.authors('2022-01-01') == [new_author]
+
+    # other connections see the changes
+    sq2 = SQLiteState(db)
+    assert sq2.authors('2022-01-01') == [new_author]
+    sq2.remove_author(new_author)
+    assert sq.authors('2022-01-01') == []
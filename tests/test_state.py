@@ -1,22 +1,23 @@
 import json
+import os
 import pytest
 
-from authorlist.state import State
+from authorlist.state import State, Store
 
 
 def test_init(json_file):
     filename = json_file({
-        'authors': 'AUTHORS',
-        'institutions': 'INSTS',
-        'thanks': 'THANKS',
-        'acknowledgements': 'ACKS',
+        'authors': [],
+        'institutions': {'INSTS': {}},
+        'thanks': {'THANKS': 'thanks'},
+        'acknowledgements': [{'from': '2020-01-01', 'to': '', 'value': 'ACKS'}],
     })
 
     s = State(filename)
-    assert s._authors == 'AUTHORS'
-    assert s._institutions == 'INSTS'
-    assert s._thanks == 'THANKS'
-    assert s._acknowledgements == 'ACKS'
+    assert s._authors == []
+    assert s._institutions == {'INSTS': {}}
+    assert s._thanks == {'THANKS': 'thanks'}
+    assert s._acknowledgements == [{'from': '2020-01-01', 'to': '', 'value': 'ACKS'}]
 
 
 AUTHOR_DATA = {
@@ -71,6 +72,12 @@ def test_authors(json_file):
     authors = s.authors('2019-01-01')
     assert authors == []
 
+    # timestamps are after the start of their day
+    s.update_authors([dict(AUTHOR_DATA['authors'][0], to='2021-06-30')])
+    assert s.authors('2021-06-30') != []
+    assert s.authors('2021-06-30T00:00:00') == []
+    assert s.authors('2020-01-01T12:00:00') != []
+
 
 def test_remove_author(json_file):
     filename = json_file(AUTHOR_DATA)
@@ -109,14 +116,6 @@ def test_add_author(json_file):
 
 
 def test_update_authors(json_file):
-    filename = json_file(AUTHOR_DATA)
-    s = State(filename)
-    
-    assert s.authors('2021-01-02') == AUTHOR_DATA['authors']
-
-    author = s._authors[0].copy()
-    author['to'] = '2021-01-01'
-
     new_author = {
       "authname": "J. Doe",
       "collab": "icecube",
@@ -132,7 +131,14 @@ def test_update_authors(json_file):
       "thanks": ['thanks1'],
       "to": "2019-12-31"
     }
-    s._authors.insert(0, new_author)
+    data = dict(AUTHOR_DATA, authors=AUTHOR_DATA['authors']+[new_author])
+    filename = json_file(data)
+    s = State(filename)
+    
+    assert s.authors('2021-01-02') == AUTHOR_DATA['authors']
+
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
 
     s.update_authors([author])
 
@@ -140,7 +146,6 @@ def test_update_authors(json_file):
     assert s.authors('2020-01-02') == [author]
     assert s.authors('2021-01-02') == []
 
-
 def test_update_most_recent_author(json_file):
     filename = json_file(AUTHOR_DATA)
     s = State(filename)
@@ -179,6 +184,30 @@ def test_insts(json_file):
     assert insts == {}
 
 
+def test_authors_by_inst(json_file):
+    names = ['B. Baker', 'A. Able', 'C. Cole']
+    data = dict(AUTHOR_DATA, authors=[
+        dict(AUTHOR_DATA['authors'][0], authname=n, keycloak_username=n.lower()) for n in names
+    ])
+    data['authors'][2]['instnames'] = ['inst1', 'inst2']
+    data['authors'][2]['from'] = '2021-01-01'
+    data['institutions'] = dict(AUTHOR_DATA['institutions'], inst2={
+        'cite': 'Inst2', 'city': 'City2', 'collabs': ['icecube-gen2'], 'name': 'Inst2',
+    })
+    s = State(json_file(data), collab='icecube')
+
+    by_inst = s.authors_by_institution('2020-06-01')
+    assert {k: [a['authname'] for a in v] for k,v in by_inst.items()} == {'inst1': ['A. Able', 'B. Baker']}
+
+    by_inst = s.authors_by_institution('2021-06-01')
+    assert {k: [a['authname'] for a in v] for k,v in by_inst.items()} == {
+        'inst1': ['A. Able', 'B. Baker', 'C. Cole'],
+        'inst2': ['C. Cole'],
+    }
+    # other collab institutions are indexed, but not listed
+    assert list(s.institutions('2021-06-01')) == ['inst1']
+
+
 def test_add_inst(json_file):
     filename = json_file(AUTHOR_DATA)
     s = State(filename)
@@ -286,6 +315,42 @@ def test_lookup_insts(json_file):
     assert not ret
 
 
+def test_lookup_insts_index(json_file):
+    s = State(json_file(AUTHOR_DATA))
+    key2 = s.add_institution('inst2', ['icecube', 'icecube-gen2'], city='City', cite='Inst2',
+                             keycloak_groups=['/a', '/b'], insert_date='2022-01-01')
+
+    assert list(s.lookup_institutions()) == ['inst1', key2]
+    assert list(s.lookup_institutions(city='City')) == ['inst1', key2]
+    assert list(s.lookup_institutions(city='City', name='Inst1')) == ['inst1']
+    # lists match the whole list
+    assert list(s.lookup_institutions(collabs=['icecube'])) == ['inst1']
+    assert list(s.lookup_institutions(collabs=['icecube', 'icecube-gen2'])) == [key2]
+    assert not s.lookup_institutions(collabs=['icecube-gen2'])
+    assert not s.lookup_institutions(keycloak_groups=['/a'])
+    # unindexed attrs are checked too
+    assert list(s.lookup_institutions(insert_date='2022-01-01')) == [key2]
+    assert not s.lookup_institutions(city='City', insert_date='2023-01-01')
+
+    # changed in place, then updated
+    groups = s.lookup_institutions(keycloak_groups=['/a', '/b'])[key2]['keycloak_groups']
+    groups.remove('/a')
+    s.update_institution(key2, keycloak_groups=groups)
+    assert list(s.lookup_institutions(keycloak_groups=['/b'])) == [key2]
+    s.update_institution(key2, city='Other')
+    assert list(s.lookup_institutions(city='City')) == ['inst1']
+    assert list(s.lookup_institutions(city='Other')) == [key2]
+
+    # rolled back changes are not found
+    with pytest.raises(RuntimeError):
+        with s.transaction():
+            s.update_institution('inst1', city='Gone')
+            assert list(s.lookup_institutions(city='Gone')) == ['inst1']
+            raise RuntimeError()
+    assert not s.lookup_institutions(city='Gone')
+    assert list(s.lookup_institutions(city='City')) == ['inst1']
+
+
 def test_thanks(json_file):
     filename = json_file(AUTHOR_DATA)
     s = State(filename)
@@ -297,6 +362,27 @@ def test_thanks(json_file):
     assert thanks == {}
 
 
+DATED_THANKS = {
+    'thanks1': [
+        {'from': '', 'to': '2021-06-30', 'value': 'Old thanks'},
+        {'from': '2021-07-01', 'to': '', 'value': 'New thanks'},
+    ],
+    'thanks2': 'Thanks2',
+}
+
+def test_thanks_dates(json_file):
+    data = dict(AUTHOR_DATA, thanks=DATED_THANKS)
+    data['authors'] = [dict(AUTHOR_DATA['authors'][0], thanks=['thanks1', 'thanks2'])]
+    s = State(json_file(data))
+
+    assert s.thanks('2020-01-01') == {'thanks1': 'Old thanks', 'thanks2': 'Thanks2'}
+    assert s.thanks('2021-06-30') == {'thanks1': 'Old thanks', 'thanks2': 'Thanks2'}
+    assert s.thanks('2021-06-30T12:00:00') == {'thanks2': 'Thanks2'}
+    assert s.thanks('2022-01-01') == {'thanks1': 'New thanks', 'thanks2': 'Thanks2'}
+    assert s.epoch('2020-01-01') != s.epoch('2022-01-01')
+    assert {'Old thanks', 'New thanks', 'Thanks2'} <= s.strings()
+
+
 def test_acks(json_file):
     filename = json_file(AUTHOR_DATA)
     s = State(filename)
@@ -306,3 +392,297 @@ def test_acks(json_file):
 
     acks = s.acknowledgements('2019-01-01')
     assert acks == []
+
+    data = dict(AUTHOR_DATA, acknowledgements=[
+        {'from': '2020-01-01', 'to': '', 'value': 'First;'},
+        {'from': '2018-01-01', 'to': '2020-06-30', 'value': 'Second;'},
+        {'from': '2021-01-01', 'to': '', 'value': 'Third;'},
+    ])
+    s = State(json_file(data))
+    assert s.acknowledgements('2019-01-01') == ['Second.']
+    assert s.acknowledgements('2020-06-30') == ['First;', 'Second.']
+    assert s.acknowledgements('2020-07-01') == ['First.']
+    assert s.acknowledgements('2021-01-01') == ['First;', 'Third.']
+
+    # an empty from is valid since the beginning
+    data = dict(AUTHOR_DATA, acknowledgements=[
+        {'from': '', 'to': '2020-06-30', 'value': 'Open;'},
+        {'from': '2020-01-01', 'to': '', 'value': 'First;'},
+    ])
+    s = State(json_file(data))
+    assert s.acknowledgements('1990-01-01') == ['Open.']
+    assert s.acknowledgements('2020-06-30') == ['Open;', 'First.']
+    assert s.acknowledgements('2020-07-01') == ['First.']
+    assert s.epoch('1990-01-01') != s.epoch('2020-07-01')
+
+
+def test_authors_collab_index(json_file):
+    data = {
+        'authors': [
+            dict(AUTHOR_DATA['authors'][0], keycloak_username='a', to='2020-06-30'),
+            dict(AUTHOR_DATA['authors'][0], keycloak_username='b', **{'from': '2020-07-01'}),
+            dict(AUTHOR_DATA['authors'][0], keycloak_username='c', collab='icecube-gen2'),
+            dict(AUTHOR_DATA['authors'][0], keycloak_username='d', legacy=True),
+            # ends before it starts, so never active
+            dict(AUTHOR_DATA['authors'][0], keycloak_username='e', to='2019-01-01'),
+        ],
+        'institutions': AUTHOR_DATA['institutions'],
+        'thanks': AUTHOR_DATA['thanks'],
+        'acknowledgements': AUTHOR_DATA['acknowledgements'],
+    }
+    filename = json_file(data)
+    s = State(filename, collab='icecube')
+
+    assert [a['keycloak_username'] for a in s.authors('2020-06-30')] == ['a']
+    assert [a['keycloak_username'] for a in s.authors('2020-07-01')] == ['b']
+    assert [a['keycloak_username'] for a in s.authors('2020-07-01', legacy=True)] == ['b', 'd']
+    assert [a['keycloak_username'] for a in s.authors('2020-06-30T12:00:00')] == []
+
+    s = State(filename)
+    assert [a['keycloak_username'] for a in s.authors('2020-07-01')] == ['b', 'c']
+
+
+def test_snapshot(json_file):
+    filename = json_file(AUTHOR_DATA)
+    s = State(filename)
+
+    assert s.epoch('2020-01-02') == s.epoch('2025-06-01')
+    assert s.epoch('2020-01-01') != s.epoch('2020-01-02')
+    assert s.epoch('2019-01-01') != s.epoch('2020-01-01')
+
+    snap = s.snapshot('2020-01-02')
+    assert snap is s.snapshot('2025-06-01')
+    assert list(snap.authors) == AUTHOR_DATA['authors']
+    assert dict(snap.institutions) == AUTHOR_DATA['institutions']
+    assert dict(snap.thanks) == {'thanks1': 'Thanks1'}
+    assert list(snap.acknowledgements) == ['Big acknowledgement!']
+    with pytest.raises(TypeError):
+        snap.thanks['thanks2'] = 'Thanks2'
+
+    # mutations make new snapshots
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+    assert s.snapshot('2025-06-01').authors == ()
+
+
+def test_snapshot_limit(json_file, monkeypatch):
+    data = dict(AUTHOR_DATA, authors=[
+        dict(AUTHOR_DATA['authors'][0], keycloak_username=f'user{i}', **{'from': f'2020-01-{i+1:02d}'})
+        for i in range(10)
+    ])
+    s = State(json_file(data))
+    monkeypatch.setattr(s, 'MAX_SNAPSHOTS', 4)
+
+    first = s.snapshot('2020-01-01')
+    for day in range(2, 11):
+        s.snapshot(f'2020-01-{day:02d}')
+        s.snapshot('2020-01-01')  # recently used, so kept
+        assert len(s._snapshots) <= 4
+    assert s.snapshot('2020-01-01') is first
+    assert len(s._snapshots) == 4
+
+
+def test_content_hash(json_file):
+    filename = json_file(AUTHOR_DATA)
+    s = State(filename)
+    s2 = State(filename)
+    assert s.content_hash == s2.content_hash
+
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+    assert s.content_hash != s2.content_hash
+    assert s.modified >= s2.modified
+
+
+def test_store_views(json_file):
+    filename = json_file(AUTHOR_DATA)
+    store = Store(filename)
+    s = State(collab='icecube', store=store)
+    s2 = State(collab='icecube-gen2', store=store)
+    s3 = State(collab='icecube', store=store)
+    assert s._authors is s2._authors
+    assert s.authors('2021-01-02') == AUTHOR_DATA['authors']
+    assert s2.authors('2021-01-02') == []
+    assert s.version == s2.version
+
+    # changes through one view show up in the others
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+    assert s3.authors('2021-01-02') == []
+    assert s3.snapshot('2021-01-02').authors == ()
+    assert s3.content_hash == s.content_hash
+    assert s3.version == s.version
+
+
+def test_username_index(json_file):
+    filename = json_file(AUTHOR_DATA)
+    s = State(filename)
+    store = s._store
+    assert store.lookup('jdoe') == AUTHOR_DATA['authors']
+    assert store.lookup('jdoe', 'icecube') == AUTHOR_DATA['authors']
+    assert store.lookup('jdoe', 'icecube-gen2') == []
+
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+    new_author = dict(author, collab='icecube-gen2', to='')
+    s.add_author(new_author)
+    assert store.lookup('jdoe') == [author, new_author]
+    assert store.lookup('jdoe', 'icecube-gen2') == [new_author]
+
+    s.remove_author(author)
+    assert store.lookup('jdoe') == [new_author]
+    assert store.lookup('jdoe', 'icecube') == []
+    assert s._authors == [new_author]
+
+    with pytest.raises(Exception):
+        s.remove_author(author)
+
+
+def test_sorted_mutations(json_file):
+    names = ['B. Baker', 'D. Dole', 'A. Able', 'C. Cole']
+    data = dict(AUTHOR_DATA, authors=[
+        dict(AUTHOR_DATA['authors'][0], authname=n, keycloak_username=n.lower()) for n in names
+    ])
+    filename = json_file(data)
+    s = State(filename)
+    assert [a['authname'] for a in s._authors] == names
+
+    # the first change sorts, later ones keep it sorted
+    s.add_author(dict(AUTHOR_DATA['authors'][0], authname='E. Eby', keycloak_username='eby'))
+    assert [a['authname'] for a in s._authors] == ['A. Able', 'B. Baker', 'C. Cole', 'D. Dole', 'E. Eby']
+    s.add_author(dict(AUTHOR_DATA['authors'][0], authname='B. Bell', keycloak_username='bell'))
+    s.remove_author(s._store.lookup('c. cole')[0])
+    assert [a['authname'] for a in s._authors] == ['A. Able', 'B. Baker', 'B. Bell', 'D. Dole', 'E. Eby']
+    assert s._store._keys == sorted(s._store._keys)
+
+
+def test_sorted_invariant(json_file):
+    names = ['B. Baker', 'A. Able']
+    data = dict(AUTHOR_DATA, authors=[
+        dict(AUTHOR_DATA['authors'][0], authname=n, keycloak_username=n.lower()) for n in names
+    ])
+    s = State(json_file(data))
+    assert not s._store.sorted
+    assert [a['authname'] for a in s.snapshot('2021-01-01').authors] == ['A. Able', 'B. Baker']
+
+    data['authors'].reverse()
+    s = State(json_file(data))
+    assert s._store.sorted
+    assert [a['authname'] for a in s.snapshot('2021-01-01').authors] == ['A. Able', 'B. Baker']
+
+
+def test_transaction(json_file):
+    filename = json_file(AUTHOR_DATA)
+    s = State(filename)
+    version = s.version
+
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    new_author = dict(author, instnames=['inst2'], to='')
+    new_author['from'] = '2021-01-02'
+    other = dict(author, authname='A. Able', keycloak_username='able', to='')
+
+    # order does not matter inside a transaction
+    with s.transaction():
+        s.add_author(new_author)
+        s.add_author(other)
+        s.update_authors([author])
+        assert s.authors('2021-01-03') == AUTHOR_DATA['authors']
+        assert s.version == version
+
+    assert s.version != version
+    assert s.authors('2020-06-01') == [other, author]
+    assert s.authors('2021-01-03') == [other, new_author]
+    assert s._store.sorted
+
+    # a conflict rolls back everything
+    authors = list(s._authors)
+    with pytest.raises(Exception, match='overlap'):
+        with s.transaction():
+            s.add_author(dict(other, keycloak_username='baker', authname='B. Baker'))
+            s.add_author(dict(new_author, to='2021-06-01'))
+    assert s._authors == authors
+    assert s._store.lookup('baker') == []
+    assert s._store.lookup('jdoe') == [author, new_author]
+
+    with pytest.raises(Exception, match='did not find match'):
+        with s.transaction():
+            s.remove_author(other)
+            s.update_authors([dict(new_author, instnames=['inst3'])])
+    assert s._authors == authors
+    assert s._store.lookup('able') == [other]
+
+
+def test_journal(json_file):
+    filename = str(json_file(AUTHOR_DATA))
+    journal = filename+'.journal'
+    with open(filename, 'rb') as f:
+        raw = f.read()
+
+    s = State(filename, journal=True)
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+    inst = s.add_institution('Inst3', collabs=['icecube'], cite='Inst3 cite')
+    with pytest.raises(Exception):
+        with s.transaction():
+            s.remove_author(author)
+            raise Exception('rollback')
+    with open(journal) as f:
+        assert len(f.readlines()) == 3
+
+    # the json file is untouched, and the journal is replayed
+    with open(filename, 'rb') as f:
+        assert f.read() == raw
+    s2 = State(filename, journal=True)
+    assert s2.authors('2021-01-02') == []
+    assert s2.authors('2020-06-01') == [author]
+    assert s2.lookup_institutions(name='Inst3') == {inst: s._institutions[inst]}
+    assert s2.content_hash == s.content_hash
+    assert State(filename).authors('2021-01-02') == AUTHOR_DATA['authors']
+
+    # an incomplete last line is cut off, so later changes survive a reload
+    with open(journal, 'a') as f:
+        f.write('{"add": [')
+    s2 = State(filename, journal=True)
+    assert s2.content_hash == s.content_hash
+    with open(journal) as f:
+        assert len(f.readlines()) == 3
+    inst2 = s2.add_institution('Inst4', collabs=['icecube'], cite='Inst4 cite')
+    assert inst2 in State(filename, journal=True)._institutions
+
+    s2.compact()
+    assert not os.path.exists(journal)
+    s3 = State(filename, journal=True)
+    assert s3.content_hash == s2.content_hash
+    assert s3.authors('2021-01-02') == []
+
+
+def test_journal_stale(json_file):
+    filename = str(json_file(AUTHOR_DATA))
+    s = State(filename, journal=True)
+    author = s._authors[0].copy()
+    author['to'] = '2021-01-01'
+    s.update_authors([author])
+
+    # as if a compaction was interrupted before clearing the journal
+    with open(filename+'.journal') as f:
+        lines = f.read()
+    s.compact()
+    with open(filename+'.journal', 'w') as f:
+        f.write(lines)
+    s2 = State(filename, journal=True)
+    assert s2.authors('2020-06-01') == [author]
+    assert s2.content_hash == s.content_hash
+    assert os.path.exists(filename+'.journal.stale')
+    assert not os.path.exists(filename+'.journal')
+
+    # new changes get a fresh journal, and survive a reload
+    inst = s2.add_institution('Inst3', collabs=['icecube'], cite='Inst3 cite')
+    s3 = State(filename, journal=True)
+    assert inst in s3._institutions
+    assert s3.content_hash == s2.content_hash